@@ -0,0 +1,279 @@
+import atexit
+import fcntl
+import ipaddress
+import json
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+METRICS = {
+    'foodgram_http_requests_total': (
+        'counter', 'HTTP requests by view action, method and status.'
+    ),
+    'foodgram_http_errors_total': (
+        'counter', 'HTTP requests that ended with a server error.'
+    ),
+    'foodgram_db_queries_total': (
+        'counter', 'SQL queries made while handling requests.'
+    ),
+    'foodgram_http_request_duration_seconds': (
+        'histogram', 'Request latency by view action.'
+    ),
+}
+
+
+def escape(value):
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def format_labels(labels):
+    return '{' + ','.join(
+        f'{name}="{escape(value)}"' for name, value in labels
+    ) + '}'
+
+
+def dump(counters, histograms):
+    return {
+        'counters': [
+            [name, labels, value]
+            for (name, labels), value in counters.items()
+        ],
+        'histograms': [
+            [name, labels, counts, total]
+            for (name, labels), (counts, total) in histograms.items()
+        ],
+    }
+
+
+def merge(counters, histograms, data):
+    """прибавляет значения из файла data"""
+    for name, labels, value in data['counters']:
+        key = (name, tuple(map(tuple, labels)))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, counts, total in data['histograms']:
+        key = (name, tuple(map(tuple, labels)))
+        summed, summed_total = histograms.get(
+            key, ([0] * len(counts), 0.0)
+        )
+        histograms[key] = (
+            [a + b for a, b in zip(summed, counts)],
+            summed_total + total,
+        )
+
+
+def read(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def write(path, data):
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as file:
+        file.write(json.dumps(data))
+    os.replace(temporary, path)
+
+
+def is_dead(filename):
+    """файл {pid}-{uuid}.json процесса, которого больше нет"""
+    pid = filename.split('-', 1)[0]
+    if not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+class MetricsRegistry:
+    """
+    Счетчики и гистограммы процесса. Каждый рабочий процесс gunicorn
+    раз в METRICS_FLUSH_INTERVAL секунд пишет свои значения в отдельный
+    файл в METRICS_DIR (атомарно, через os.replace), страница метрик
+    складывает файлы всех процессов. Файлы завершившихся процессов
+    сливаются в archive.json, чтобы счетчики не уменьшались, а число
+    файлов не росло с каждым перезапуском. Процессы проверяются по pid,
+    поэтому METRICS_DIR не должен быть общим для нескольких хостов
+    и контейнеров.
+    """
+    archive_name = 'archive.json'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _reset(self):
+        # в новом процессе, в том числе после fork, - свой файл и поток
+        self._pid = os.getpid()
+        self.counters = {}
+        self.histograms = {}
+        self.dirty = False
+        self.path = os.path.join(
+            settings.METRICS_DIR, f'{self._pid}-{uuid.uuid4().hex}.json'
+        )
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        threading.Thread(
+            target=self._flush_loop, name='metrics-flush', daemon=True
+        ).start()
+
+    def _ensure_process(self):
+        if self._pid != os.getpid():
+            self._reset()
+
+    def inc(self, name, labels, value=1):
+        key = (name, tuple(labels))
+        with self._lock:
+            self._ensure_process()
+            self.counters[key] = self.counters.get(key, 0) + value
+            self.dirty = True
+
+    def observe(self, name, labels, value):
+        key = (name, tuple(labels))
+        with self._lock:
+            self._ensure_process()
+            counts, total = self.histograms.get(
+                key, ([0] * (len(BUCKETS) + 1), 0.0)
+            )
+            for index, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self.histograms[key] = (counts, total + value)
+            self.dirty = True
+
+    def snapshot(self):
+        return dump(self.counters, self.histograms)
+
+    def flush(self):
+        with self._lock:
+            if self._pid != os.getpid() or not self.dirty:
+                return
+            data = self.snapshot()
+            self.dirty = False
+        write(self.path, data)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(settings.METRICS_FLUSH_INTERVAL)
+            self.flush()
+
+    def prune(self, directory):
+        """
+        Сливает файлы завершившихся процессов в архив и удаляет их.
+        В архиве - имена слитых файлов: если процесс упадет, не успев
+        их удалить, значения не сложатся дважды.
+        """
+        dead = [
+            filename for filename in os.listdir(directory)
+            if filename.endswith(('.json', '.json.tmp'))
+            and is_dead(filename)
+        ]
+        if not dead:
+            return
+        path = os.path.join(directory, self.archive_name)
+        archive = read(path) or {'counters': [], 'histograms': []}
+        merged = set(archive.get('merged', ()))
+        counters, histograms = {}, {}
+        merge(counters, histograms, archive)
+        for filename in dead:
+            if filename.endswith('.json') and filename not in merged:
+                data = read(os.path.join(directory, filename))
+                if data is not None:
+                    merge(counters, histograms, data)
+        write(path, {
+            **dump(counters, histograms),
+            'merged': sorted(
+                filename for filename in dead if filename.endswith('.json')
+            ),
+        })
+        for filename in dead:
+            try:
+                os.remove(os.path.join(directory, filename))
+            except FileNotFoundError:
+                pass
+
+    def collect(self):
+        """
+        Значения всех процессов; свой процесс - из памяти. Страницу могут
+        запросить у нескольких процессов сразу: слияние и чтение идут
+        под блокировкой, чтобы не увидеть архив и слитый в него файл
+        одновременно.
+        """
+        self.flush()
+        counters, histograms = {}, {}
+        directory = settings.METRICS_DIR
+        if not os.path.isdir(directory):
+            return counters, histograms
+        with open(os.path.join(directory, 'archive.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self.prune(directory)
+            for filename in os.listdir(directory):
+                if not filename.endswith('.json'):
+                    continue
+                data = read(os.path.join(directory, filename))
+                if data is not None:
+                    merge(counters, histograms, data)
+        return counters, histograms
+
+    def render(self):
+        """текстовый формат Prometheus"""
+        counters, histograms = self.collect()
+        lines = []
+        for metric, (kind, description) in METRICS.items():
+            lines.append(f'# HELP {metric} {description}')
+            lines.append(f'# TYPE {metric} {kind}')
+            for (name, labels), value in sorted(counters.items()):
+                if name == metric:
+                    lines.append(f'{name}{format_labels(labels)} {value}')
+            for (name, labels), (counts, total) in sorted(histograms.items()):
+                if name != metric:
+                    continue
+                cumulative = 0
+                for bound, count in zip((*BUCKETS, '+Inf'), counts):
+                    cumulative += count
+                    bucket = format_labels((*labels, ('le', bound)))
+                    lines.append(f'{name}_bucket{bucket} {cumulative}')
+                lines.append(f'{name}_sum{format_labels(labels)} {total}')
+                lines.append(
+                    f'{name}_count{format_labels(labels)} {cumulative}'
+                )
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+atexit.register(registry.flush)
+
+
+def is_internal(address):
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return address.is_private or address.is_loopback
+
+
+def metrics_view(request):
+    """
+    Метрики для Prometheus. Страница только для внутренней сети:
+    nginx ее не проксирует, а запросы с публичных адресов
+    получают 404.
+    """
+    if not settings.METRICS_ENABLED or not is_internal(
+            request.META.get('REMOTE_ADDR')):
+        raise Http404
+    return HttpResponse(
+        registry.render(), content_type='text/plain; version=0.0.4'
+    )
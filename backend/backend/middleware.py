@@ -0,0 +1,285 @@
+import asyncio
+import json
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .metrics import registry
+from .routers import REPLICA, is_pinned, pin, use_replica
+
+logger = logging.getLogger(__name__)
+
+
+def view_name(request, view_func):
+    """RecipeViewSet.list, RecipeViewSet.download_shopping_cart и т.п."""
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return getattr(view_func, '__qualname__', type(view_func).__name__)
+    method = request.method.lower()
+    actions = getattr(view_func, 'actions', None) or {}
+    return f'{cls.__name__}.{actions.get(method, method)}'
+
+
+class RequestTiming:
+    """замеры одного запроса; считает SQL-запросы как execute_wrapper"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view = None
+        self.queries = 0
+        self.sql = 0.0
+        self.render = 0.0
+        self.render_started = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql += time.perf_counter() - started
+            self.queries += 1
+
+    def rendered(self, response):
+        self.render = time.perf_counter() - self.render_started
+        return response
+
+    def metrics(self):
+        """длительности в миллисекундах"""
+        total = (time.perf_counter() - self.started) * 1000
+        sql = self.sql * 1000
+        render = self.render * 1000
+        return {
+            'db': sql,
+            'render': render,
+            'app': max(total - sql - render, 0),
+            'total': total,
+        }
+
+
+class TimedStream:
+    """
+    Тело потокового ответа формируется уже после выхода из middleware:
+    SQL-запросы в нем считаются здесь (если передан timing), а finish
+    вызывается, когда поток прочитан до конца или закрыт.
+    """
+
+    def __init__(self, content, timing, finish):
+        self.content = content
+        self.timing = timing
+        self.finish = finish
+        self.finished = False
+
+    def __iter__(self):
+        with ExitStack() as stack:
+            if self.timing is not None:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(self.timing)
+                    )
+            yield from self.content
+        self.close()
+
+    def close(self):
+        # StreamingHttpResponse.close вызывает close у своего содержимого
+        if not self.finished:
+            self.finished = True
+            self.finish()
+
+
+def after_stream(response, timing, finish):
+    response.streaming_content = TimedStream(
+        response.streaming_content, timing, finish
+    )
+
+
+class ServerTimingMiddleware:
+    """
+    Число и время SQL-запросов, время рендеринга ответа и остальное
+    время запроса (представление и сериализация) в заголовке
+    Server-Timing. Запросы дольше SLOW_REQUEST_MS или с числом
+    SQL-запросов от SLOW_REQUEST_QUERIES пишутся в лог одной строкой
+    JSON. Заголовок уходит раньше тела потокового ответа и его не
+    учитывает, лог такого ответа пишется после отправки тела.
+    Выключенный (REQUEST_TIMING=0) middleware Django
+    убирает из цепочки, и он ничего не стоит.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_TIMING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timing = request.timing = RequestTiming()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timing))
+            response = self.get_response(request)
+        metrics = timing.metrics()
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={metrics["db"]:.1f};desc="queries: {timing.queries}"',
+            f'render;dur={metrics["render"]:.1f}',
+            f'app;dur={metrics["app"]:.1f}',
+            f'total;dur={metrics["total"]:.1f}',
+            f'view;desc="{timing.view or "-"}"',
+        ])
+        if response.streaming:
+            after_stream(
+                response, timing,
+                lambda: self.check_slow(request, response, timing),
+            )
+        else:
+            self.check_slow(request, response, timing)
+        return response
+
+    def check_slow(self, request, response, timing):
+        metrics = timing.metrics()
+        if (metrics['total'] >= settings.SLOW_REQUEST_MS
+                or timing.queries >= settings.SLOW_REQUEST_QUERIES):
+            self.log_slow(request, response, timing, metrics)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.timing.view = view_name(request, view_func)
+
+    def process_template_response(self, request, response):
+        # ответы DRF рендерятся после представления
+        timing = request.timing
+        timing.render_started = time.perf_counter()
+        response.add_post_render_callback(timing.rendered)
+        return response
+
+    @staticmethod
+    def log_slow(request, response, timing, metrics):
+        record = {
+            'view': timing.view,
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'queries': timing.queries,
+            **{f'{name}_ms': round(value, 1)
+               for name, value in metrics.items()},
+        }
+        logger.warning(
+            'slow request %s', json.dumps(record, ensure_ascii=False),
+            extra={'timing': record},
+        )
+
+
+class MetricsMiddleware:
+    """
+    Число запросов, ошибок и SQL-запросов и гистограмма времени ответа
+    по действию - имени URL: recipes-list,
+    recipes-download-shopping-cart, subscriptions. Данные отдает
+    страница /metrics/, см. backend/metrics.py. Потоковый ответ
+    учитывается вместе с телом, когда оно отправлено.
+    Работает и под ASGI, но там ORM выполняется в других потоках,
+    и SQL-запросы не считаются.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # как MiddlewareMixin: так Django узнает асинхронный вызов
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self):
+            return self.__acall__(request)
+        # SQL-запросы уже считает ServerTimingMiddleware, если он включен,
+        # в том числе в теле потокового ответа
+        timing = getattr(request, 'timing', None)
+        stream_timing = None
+        with ExitStack() as stack:
+            if timing is None:
+                timing = stream_timing = RequestTiming()
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timing))
+            queries = timing.queries
+            started = time.perf_counter()
+            response = self.get_response(request)
+
+        def finish():
+            self.record(
+                request, response, time.perf_counter() - started,
+                timing.queries - queries,
+            )
+        if response.streaming:
+            after_stream(response, stream_timing, finish)
+        else:
+            finish()
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+
+        def finish():
+            self.record(request, response, time.perf_counter() - started)
+        if response.streaming:
+            after_stream(response, None, finish)
+        else:
+            finish()
+        return response
+
+    @staticmethod
+    def record(request, response, duration, queries=None):
+        match = request.resolver_match
+        action = (match.url_name or match.view_name) if match else 'unmatched'
+        labels = (('action', action),)
+        registry.inc('foodgram_http_requests_total', (
+            *labels, ('method', request.method),
+            ('status', response.status_code),
+        ))
+        if response.status_code >= 500:
+            registry.inc('foodgram_http_errors_total', labels)
+        if queries is not None:
+            registry.inc('foodgram_db_queries_total', labels, queries)
+        registry.observe(
+            'foodgram_http_request_duration_seconds', labels, duration
+        )
+
+
+class ReplicaMiddleware:
+    """
+    Отправляет чтение на реплику для действий из replica_actions
+    представления (list и retrieve рецептов, тегов, ингредиентов,
+    get подписок). Клиент, который только что писал, еще
+    REPLICA_STICKY_SECONDS секунд читает с основной БД.
+    Без реплики в DATABASES не подключается.
+    """
+    safe_methods = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        if REPLICA not in settings.DATABASES:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.replica_token = None
+        try:
+            response = self.get_response(request)
+        finally:
+            if request.replica_token is not None:
+                use_replica.reset(request.replica_token)
+        if request.method not in self.safe_methods:
+            pin(request, response, settings.REPLICA_STICKY_SECONDS)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in self.safe_methods:
+            return
+        cls = getattr(view_func, 'cls', None)
+        if cls is None:
+            return
+        action = view_name(request, view_func).rsplit('.', 1)[-1]
+        if action in getattr(cls, 'replica_actions', ()) and (
+                not is_pinned(request)):
+            request.replica_token = use_replica.set(True)
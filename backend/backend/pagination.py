@@ -1,6 +1,46 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class LimitCursorPaginator(CursorPagination):
+    """
+    Постраничный вывод по ключу id без COUNT(*) и OFFSET:
+    время получения страницы не зависит от ее номера.
+    """
+    page_size_query_param = 'limit'
+    page_size = 6
+    ordering = '-id'
 
 
 class LimitPageNumberPaginator(PageNumberPagination):
+    """
+    Номера страниц по умолчанию, курсор - если в запросе есть
+    параметр cursor (для первой страницы - пустой: ?cursor=).
+    Курсор идет по id, поэтому с параметрами, задающими свой порядок
+    (поиск по релевантности), он не используется: такие списки
+    всегда выводятся по номерам страниц.
+    """
     page_size_query_param = 'limit'
     page_size = 6
+    cursor_query_param = 'cursor'
+    ordering_query_params = ('search',)
+    cursor_paginator = None
+
+    def use_cursor(self, request):
+        params = request.query_params
+        return self.cursor_query_param in params and not any(
+            params.get(name, '').strip()
+            for name in self.ordering_query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request):
+            self.cursor_paginator = LimitCursorPaginator()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
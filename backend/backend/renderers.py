@@ -0,0 +1,37 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Компактный JSON через orjson, байт в байт как у JSONRenderer.
+    Без orjson, с отступами (?format=json; indent=4 и Browsable API)
+    или при настройках, которые orjson не повторяет, - обычный
+    JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if (
+            orjson is None or not self.compact or self.ensure_ascii
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data, default=self.encoder_class().default,
+                option=(orjson.OPT_PASSTHROUGH_DATETIME
+                        | orjson.OPT_NON_STR_KEYS),
+            )
+        except orjson.JSONEncodeError:
+            # например, целые больше 64 бит
+            return super().render(data, accepted_media_type, renderer_context)
+        # как JSONRenderer: JSON остается подмножеством JavaScript
+        return ret.replace(
+            '\u2028'.encode(), b'\\u2028'
+        ).replace('\u2029'.encode(), b'\\u2029')
@@ -0,0 +1,67 @@
+import hashlib
+import time
+from contextvars import ContextVar
+
+from django.core.cache import cache
+
+REPLICA = 'replica'
+PIN_COOKIE = 'primary_until'
+# ReplicaMiddleware решает до аутентификации DRF: токен и пользователя
+# читаем с основной БД, иначе отставшая реплика не узнает новый токен
+# и еще принимает отозванный
+PRIMARY_MODELS = {'authtoken.token', 'users.user'}
+
+use_replica = ContextVar('use_replica', default=False)
+
+
+class ReplicaRouter:
+    """
+    Чтение - с реплики, если ReplicaMiddleware разрешил ее для текущего
+    запроса; все остальное, включая записи, - с основной БД.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.label_lower in PRIMARY_MODELS:
+            return None
+        return REPLICA if use_replica.get() else None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # реплика - копия основной БД
+        return True
+
+
+def pin_key(request):
+    """клиент с токеном узнается по заголовку Authorization"""
+    authorization = request.META.get('HTTP_AUTHORIZATION')
+    if not authorization:
+        return None
+    digest = hashlib.sha256(authorization.encode()).hexdigest()
+    return f'primary-pin:{digest}'
+
+
+def is_pinned(request):
+    """клиент недавно писал и должен читать свои записи с основной БД"""
+    try:
+        if float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time():
+            return True
+    except ValueError:
+        pass
+    key = pin_key(request)
+    return key is not None and cache.get(key) is not None
+
+
+def pin(request, response, seconds):
+    """
+    Закрепляет клиента за основной БД: cookie для браузера и запись
+    в кеше для клиентов с токеном, которые не хранят cookie.
+    """
+    response.set_cookie(
+        PIN_COOKIE, str(time.time() + seconds), max_age=seconds,
+        httponly=True, samesite='Lax',
+    )
+    key = pin_key(request)
+    if key is not None:
+        cache.set(key, 1, seconds)
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
 
 from django.utils.translation import gettext_lazy as _
 from dotenv import load_dotenv
@@ -42,6 +43,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'django_filters',
@@ -52,6 +54,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'backend.middleware.ServerTimingMiddleware',
+    'backend.middleware.MetricsMiddleware',
+    'backend.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -80,6 +85,8 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'backend.wsgi.application'
+# SERVER_MODE=asgi - процессы uvicorn, см. gunicorn.conf.py
+ASGI_APPLICATION = 'backend.asgi.application'
 
 
 # Database
@@ -96,6 +103,64 @@ DATABASES = {
     }
 }
 
+# Реплика для чтения: списки и страницы рецептов, тегов, ингредиентов
+# и подписки читаются с нее, см. backend/routers.py. Для проверки
+# на SQLite достаточно DB_REPLICA_NAME с копией файла основной БД.
+if os.getenv('DB_REPLICA_HOST') or os.getenv('DB_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.getenv('DB_REPLICA_NAME', default=DATABASES['default']['NAME']),
+        'HOST': os.getenv('DB_REPLICA_HOST', default=DATABASES['default']['HOST']),
+        'PORT': os.getenv('DB_REPLICA_PORT', default=DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_ROUTERS = ['backend.routers.ReplicaRouter']
+
+# сколько секунд после записи клиент читает с основной БД
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', default=10))
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# В ключах кеша ответов рецептов - номера версий данных из БД
+# (recipes/cache.py), поэтому изменение из любого процесса видно сразу.
+# LocMemCache у каждого процесса свой; общий кеш, например
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache, дает больше
+# попаданий при нескольких воркерах gunicorn.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
+    }
+}
+
+RECIPE_CACHE_TIMEOUT = int(os.getenv('RECIPE_CACHE_TIMEOUT', default=60))
+# сериализаторы только для чтения для списков рецептов, подписок
+# и ингредиентов, см. recipes/fast_serializers.py
+FAST_SERIALIZERS = os.getenv('FAST_SERIALIZERS', default='1') == '1'
+
+# заголовок Server-Timing и лог медленных запросов, см. backend/middleware.py
+REQUEST_TIMING = os.getenv('REQUEST_TIMING', default='0') == '1'
+SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', default=500))
+SLOW_REQUEST_QUERIES = int(os.getenv('SLOW_REQUEST_QUERIES', default=30))
+
+# метрики Prometheus по действиям API на /metrics/, см. backend/metrics.py
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', default='1') == '1'
+METRICS_DIR = os.getenv(
+    'METRICS_DIR', default=os.path.join(tempfile.gettempdir(), 'foodgram-metrics')
+)
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', default=1))
+
+# кеш токенов авторизации, см. users/authentication.py; 0 - выключен.
+# Работает только с общим CACHE_BACKEND: через него выход и смена
+# пароля сразу видны всем процессам gunicorn
+AUTH_TOKEN_CACHE_TTL = int(os.getenv('AUTH_TOKEN_CACHE_TTL', default=300))
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', default=10000))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -151,11 +216,15 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
-    ]
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'backend.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 DJOSER = {
@@ -178,3 +247,17 @@ DJOSER = {
 
 FOODGRAM = 'Foodgram'
 SHOPPING_CART = 'Привет, {username}! Вот твой список покупок:'
+
+SEARCH_CONFIG = 'russian'
+INGREDIENT_SEARCH_LIMIT = 50
+INGREDIENT_INDEX_TTL = 300
+TAG_CATALOGUE_TTL = 300
+
+IMAGE_PROCESSING_WORKERS = int(os.getenv('IMAGE_PROCESSING_WORKERS', 2))
+RECIPE_IMAGE_MAX_SIZE = 2048
+RECIPE_IMAGE_MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+RECIPE_IMAGE_MAX_DIMENSION = 10000
+RECIPE_THUMBNAIL_SIZES = {
+    'card': 480,
+    'detail': 1200,
+}
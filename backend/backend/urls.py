@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.urls import include, path
 
+from .metrics import metrics_view
+
 api_patterns = [
     path('', include('users.urls', namespace='api_users')),
     path('', include('recipes.urls', namespace='api_recipes')),
@@ -9,4 +11,5 @@ api_patterns = [
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include(api_patterns)),
+    path('metrics/', metrics_view, name='metrics'),
 ]
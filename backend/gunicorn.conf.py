@@ -0,0 +1,16 @@
+"""
+Настройки gunicorn: gunicorn -c gunicorn.conf.py
+SERVER_MODE=asgi запускает backend.asgi на процессах uvicorn:
+один процесс обслуживает много соединений одновременно.
+По умолчанию - backend.wsgi на синхронных процессах.
+"""
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', 1))
+
+if os.getenv('SERVER_MODE', 'wsgi') == 'asgi':
+    wsgi_app = 'backend.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'backend.wsgi:application'
@@ -1,7 +1,7 @@
 from django.contrib import admin
 
 from .models import (Favorite, Ingredient, IngredientRecipe, Recipe,
-                     ShoppingCart, Tag, TagRecipe)
+                     ShoppingCart, ShoppingListItem, Tag, TagRecipe)
 
 
 class TagRecipeInline(admin.TabularInline):
@@ -25,8 +25,9 @@ class RecipeAdmin(admin.ModelAdmin):
         TagRecipeInline
     ]
 
+    @admin.display(description='В избранном', ordering='favorites_count')
     def total_favorited(self, obj):
-        return Favorite.objects.filter(recipe=obj).count()
+        return obj.favorites_count
 
 
 class IngredientAdmin(admin.ModelAdmin):
@@ -42,9 +43,15 @@ class IngredientRecipeAdmin(admin.ModelAdmin):
     list_display = ('recipe', 'ingredient')
 
 
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = ('user', 'ingredient', 'amount')
+    search_fields = ('user__username', 'ingredient__name')
+
+
 admin.site.register(Tag)
 admin.site.register(Ingredient, IngredientAdmin)
 admin.site.register(Recipe, RecipeAdmin)
 admin.site.register(IngredientRecipe, IngredientRecipeAdmin)
 admin.site.register(ShoppingCart)
+admin.site.register(ShoppingListItem, ShoppingListItemAdmin)
 admin.site.register(Favorite, FavoriteAdmin)
@@ -0,0 +1,96 @@
+import json
+from hashlib import md5
+
+from .models import DataVersion, Recipe
+
+CATALOGUE = 'catalogue'
+RECIPES = 'recipes'
+USER_FILTERS = ('is_favorited', 'is_in_shopping_cart')
+
+
+def recipe_version(recipe_id):
+    return f'recipe:{recipe_id}'
+
+
+def user_version(user_id):
+    return f'user:{user_id}'
+
+
+def get_versions(request, names):
+    """
+    Текущие версии данных (DataVersion). За запрос они читаются один
+    раз и сразу с версией пользователя: ее ждут ключ кеша и ETag.
+    """
+    memo = request.__dict__.setdefault('_data_versions', {})
+    wanted = list(names)
+    if request.user.is_authenticated:
+        wanted.append(user_version(request.user.id))
+    missing = [name for name in wanted if name not in memo]
+    if missing:
+        memo.update(zip(missing, DataVersion.objects.get_many(missing)))
+    return [memo[name] for name in names]
+
+
+def bump_versions(*names):
+    """
+    Новая версия делает недоступными все ответы, закешированные
+    со старой. Вызывается в транзакции записи.
+    """
+    DataVersion.objects.bump(*names)
+
+
+def response_key(prefix, request, names, extra=''):
+    raw = json.dumps([
+        request.get_host(),
+        sorted(request.query_params.lists()),
+        extra,
+        get_versions(request, names),
+    ])
+    return f'foodgram:{prefix}:{md5(raw.encode()).hexdigest()}'
+
+
+def recipe_list_key(request):
+    """
+    Общий для всех ключ списка рецептов. Фильтры по избранному
+    и корзине зависят от пользователя - тогда в ключе его id и версия.
+    """
+    names = [CATALOGUE, RECIPES]
+    user_id = ''
+    if request.user.is_authenticated and any(
+        name in request.query_params for name in USER_FILTERS
+    ):
+        user_id = request.user.id
+        names.append(user_version(user_id))
+    return response_key('recipes:list', request, names, user_id)
+
+
+def recipe_detail_key(request, pk):
+    return response_key(
+        'recipes:detail', request, [CATALOGUE, recipe_version(pk)], pk
+    )
+
+
+def overlay_user_fields(user, recipes):
+    """
+    Проставляет в закешированные рецепты поля текущего пользователя:
+    is_favorited, is_in_shopping_cart и is_subscribed автора.
+    """
+    flags = {}
+    if user.is_authenticated and recipes:
+        flags = {
+            row['id']: row
+            for row in Recipe.objects.filter(
+                id__in=[recipe['id'] for recipe in recipes]
+            ).with_user_flags(user).values(
+                'id', 'is_favorited', 'is_in_shopping_cart',
+                'author_is_subscribed'
+            ).order_by()
+        }
+    for recipe in recipes:
+        row = flags.get(recipe['id'], {})
+        recipe['is_favorited'] = row.get('is_favorited', False)
+        recipe['is_in_shopping_cart'] = row.get('is_in_shopping_cart', False)
+        recipe['author']['is_subscribed'] = row.get(
+            'author_is_subscribed', False
+        )
+    return recipes
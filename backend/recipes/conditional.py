@@ -0,0 +1,128 @@
+"""
+ETag и Last-Modified для django.views.decorators.http.condition.
+Значения считаются без сериализаторов: по времени изменения записей,
+по состоянию индекса ингредиентов, для рецептов - по тем же версиям
+данных, что и ключи кеша ответов (recipes/cache.py).
+"""
+from hashlib import md5
+
+from django.db.models import Count, Max
+
+from .cache import (get_versions, recipe_detail_key, recipe_list_key,
+                    user_version)
+from .ingredient_index import ingredient_index
+from .models import Ingredient, Recipe
+from .tag_catalogue import tag_catalogue
+
+
+def make_etag(*parts):
+    return md5(repr(parts).encode()).hexdigest()
+
+
+def memoize(request, name, func):
+    """condition вызывает функции ETag и Last-Modified отдельно"""
+    memo = request.__dict__.setdefault('_conditional_memo', {})
+    if name not in memo:
+        memo[name] = func()
+    return memo[name]
+
+
+def table_state(request, model):
+    return memoize(
+        request, f'{model.__name__}:table',
+        lambda: model.objects.aggregate(
+            count=Count('id'), updated_at=Max('updated_at')
+        )
+    )
+
+
+def row_updated_at(request, model, pk):
+    return memoize(
+        request, f'{model.__name__}:{pk}',
+        lambda: model.objects.filter(pk=pk).values_list(
+            'updated_at', flat=True
+        ).first()
+    )
+
+
+def tag_list_etag(request, *args, **kwargs):
+    return make_etag('tags', *tag_catalogue.state())
+
+
+def tag_list_last_modified(request, *args, **kwargs):
+    return tag_catalogue.state()[1]
+
+
+def tag_etag(request, pk, *args, **kwargs):
+    tag = tag_catalogue.get(pk)
+    if tag is None:
+        return None
+    return make_etag('Tag', pk, tag.updated_at)
+
+
+def tag_last_modified(request, pk, *args, **kwargs):
+    tag = tag_catalogue.get(pk)
+    return tag.updated_at if tag is not None else None
+
+
+def object_etag(model):
+    def etag(request, pk, *args, **kwargs):
+        updated_at = row_updated_at(request, model, pk)
+        if updated_at is None:
+            return None
+        return make_etag(model.__name__, pk, updated_at)
+    return etag
+
+
+def object_last_modified(model):
+    def last_modified(request, pk, *args, **kwargs):
+        return row_updated_at(request, model, pk)
+    return last_modified
+
+
+def ingredient_list_state(request):
+    """поиск отвечает из индекса в памяти - ETag берется оттуда же"""
+    name = request.GET.get('name', '').strip()
+    if name:
+        count, updated_at = ingredient_index.state()
+        return name.lower(), count, updated_at
+    state = table_state(request, Ingredient)
+    return '', state['count'], state['updated_at']
+
+
+def ingredient_list_etag(request, *args, **kwargs):
+    return make_etag('ingredients', *ingredient_list_state(request))
+
+
+def ingredient_list_last_modified(request, *args, **kwargs):
+    return ingredient_list_state(request)[2]
+
+
+def user_token(request):
+    """
+    Поля пользователя в рецептах меняются вместе с его версией;
+    она прочитана тем же запросом, что и версии ключа кеша.
+    """
+    if request.user.is_authenticated:
+        return get_versions(request, [user_version(request.user.id)])[0]
+    return ''
+
+
+def recipe_list_etag(request, *args, **kwargs):
+    return make_etag(recipe_list_key(request), user_token(request))
+
+
+def recipe_detail_etag(request, pk, *args, **kwargs):
+    return make_etag(recipe_detail_key(request, pk), user_token(request))
+
+
+def recipe_detail_last_modified(request, pk, *args, **kwargs):
+    """
+    Только для анонимных пользователей: у остальных в ответе есть поля
+    избранного и корзины, время изменения которых не хранится.
+    Изменение тегов, ингредиентов и автора обновляет updated_at
+    рецепта (recipes/signals.py).
+    """
+    if request.user.is_authenticated:
+        return None
+    return row_updated_at(request, Recipe, pk)
@@ -0,0 +1,49 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from users.models import Follow, User
+from .models import Favorite, Recipe
+
+BATCH_SIZE = 5000
+
+
+def counters():
+    """счетчик: модель, поле и модель строк, которые он считает"""
+    return (
+        (Recipe, 'favorites_count', Favorite, 'recipe'),
+        (User, 'recipes_count', Recipe, 'author'),
+        (User, 'followers_count', Follow, 'author'),
+    )
+
+
+def change_counter(model, pk, field, delta):
+    """атомарно меняет счетчик одной записи, не опуская его ниже нуля"""
+    queryset = model.objects.filter(pk=pk)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def actual_count(related, lookup):
+    return Coalesce(Subquery(
+        related.objects.filter(**{lookup: OuterRef('pk')}).order_by()
+        .values(lookup).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def reconcile_counters():
+    """
+    Сверяет счетчики с настоящим числом строк и исправляет
+    только разошедшиеся записи. Возвращает число исправлений по полям.
+    """
+    fixed = {}
+    for model, field, related, lookup in counters():
+        drifted = list(model.objects.annotate(
+            actual=actual_count(related, lookup)
+        ).exclude(**{field: F('actual')}).values_list('pk', flat=True))
+        for start in range(0, len(drifted), BATCH_SIZE):
+            model.objects.filter(
+                pk__in=drifted[start:start + BATCH_SIZE]
+            ).update(**{field: actual_count(related, lookup)})
+        fixed[f'{model._meta.model_name}.{field}'] = len(drifted)
+    return fixed
@@ -0,0 +1,114 @@
+from django.conf import settings
+
+from .fields import thumbnail_urls
+
+
+def fast_serializers_enabled(request):
+    """
+    Быстрые сериализаторы отдают только JSON: Browsable API строит
+    по сериализатору формы, ему нужен настоящий сериализатор DRF.
+    """
+    renderer = getattr(request, 'accepted_renderer', None)
+    return (settings.FAST_SERIALIZERS
+            and getattr(renderer, 'format', None) == 'json')
+
+
+def file_url(file, request):
+    """как FileField из DRF: абсолютная ссылка или None"""
+    if not file:
+        return None
+    url = file.storage.url(file.name)
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+def user_data(user, is_subscribed):
+    return {
+        'email': user.email,
+        'id': user.id,
+        'username': user.username,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'is_subscribed': is_subscribed,
+    }
+
+
+def short_recipe_data(recipe, request):
+    return {
+        'id': recipe.id,
+        'name': recipe.name,
+        'image': file_url(recipe.image, request),
+        'thumbnails': thumbnail_urls(recipe, request),
+        'cooking_time': recipe.cooking_time,
+    }
+
+
+class FastSerializer:
+    """
+    Сериализатор только для чтения: собирает словари напрямую, без
+    полей DRF, и дает тот же JSON, что и обычный сериализатор.
+    Повторяет его интерфейс для GenericAPIView: instance, many,
+    context и data.
+    """
+
+    def __init__(self, instance=None, many=False, context=None, **kwargs):
+        self.instance = instance
+        self.many = many
+        self.context = context or {}
+
+    @property
+    def data(self):
+        if self.many:
+            return [self.to_representation(item) for item in self.instance]
+        return self.to_representation(self.instance)
+
+    def to_representation(self, instance):
+        raise NotImplementedError
+
+
+class FastIngredientSerializer(FastSerializer):
+    """ингредиенты из строк .values(*fields) или из объектов"""
+    fields = ('id', 'name', 'measurement_unit')
+
+    def to_representation(self, ingredient):
+        if isinstance(ingredient, dict):
+            return {field: ingredient[field] for field in self.fields}
+        return {field: getattr(ingredient, field) for field in self.fields}
+
+
+class FastRecipeSerializer(FastSerializer):
+    """
+    То же, что RecipeSerializer, для рецептов из
+    Recipe.objects.with_related().with_user_flags(user).
+    """
+
+    def to_representation(self, recipe):
+        request = self.context.get('request')
+        return {
+            'id': recipe.id,
+            'tags': [
+                {
+                    'id': tag.id,
+                    'name': tag.name,
+                    'color': tag.color,
+                    'slug': tag.slug,
+                }
+                for tag in recipe.tags.all()
+            ],
+            'ingredients': [
+                {
+                    'id': row.ingredient.id,
+                    'name': row.ingredient.name,
+                    'measurement_unit': row.ingredient.measurement_unit,
+                    'amount': row.amount,
+                }
+                for row in recipe.ingredient_recipe.all()
+            ],
+            'author': user_data(recipe.author, recipe.author_is_subscribed),
+            'name': recipe.name,
+            'image': file_url(recipe.image, request),
+            'thumbnails': thumbnail_urls(recipe, request),
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+            'is_favorited': recipe.is_favorited,
+            'is_in_shopping_cart': recipe.is_in_shopping_cart,
+        }
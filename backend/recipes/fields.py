@@ -0,0 +1,77 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import UploadedFile
+from drf_extra_fields.fields import Base64ImageField
+from PIL import Image, UnidentifiedImageError
+from rest_framework import serializers
+
+from .images import is_processed, thumbnail_names
+
+
+def thumbnail_urls(recipe, request=None):
+    """ссылки на миниатюры рецепта или None, пока они не построены"""
+    if not is_processed(recipe):
+        return None
+    urls = {}
+    for size, names in thumbnail_names(recipe.image.name).items():
+        urls[size] = {}
+        for image_format, name in names.items():
+            url = default_storage.url(name)
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            urls[size][image_format] = url
+    return urls
+
+
+class RecipeImageField(Base64ImageField):
+    """
+    Изображение рецепта строкой base64 в JSON или файлом из
+    multipart/form-data. Размер проверяется до декодирования base64,
+    ширина и высота - по заголовку, без декодирования всего растра.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, UploadedFile):
+            self.check_dimensions(data)
+            return serializers.ImageField.to_internal_value(self, data)
+        if isinstance(data, str) and len(data) * 3 // 4 > (
+                settings.RECIPE_IMAGE_MAX_UPLOAD_SIZE):
+            raise serializers.ValidationError(
+                'Файл изображения слишком большой.'
+            )
+        image = super().to_internal_value(data)
+        if image is not None:
+            self.check_dimensions(image)
+        return image
+
+    @staticmethod
+    def check_dimensions(file):
+        try:
+            with Image.open(file) as image:
+                width, height = image.size
+        except (UnidentifiedImageError, OSError):
+            # сообщение о неверном изображении даст ImageField
+            return
+        finally:
+            file.seek(0)
+        max_side = settings.RECIPE_IMAGE_MAX_DIMENSION
+        if width > max_side or height > max_side:
+            raise serializers.ValidationError(
+                f'Изображение больше {max_side} точек по стороне.'
+            )
+
+
+class ThumbnailsField(serializers.Field):
+    """
+    Ссылки на миниатюры изображения рецепта по размерам и форматам:
+    {"card": {"jpeg": ..., "webp": ...}, "detail": {...}}.
+    Пока изображение не обработано - null, клиент показывает оригинал.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        return thumbnail_urls(recipe, self.context.get('request'))
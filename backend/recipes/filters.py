@@ -1,23 +1,48 @@
 from django_filters.rest_framework import FilterSet, filters
-from rest_framework.filters import SearchFilter
 
 from .models import Recipe
+from .tag_catalogue import tag_catalogue
 
 
-class IngredientSearchFilter(SearchFilter):
-    search_param = 'name'
+TAG_MODES = (('any', 'any'), ('all', 'all'))
+
+
+def tag_slug_choices():
+    # функция, а не метод каталога: фильтры FilterSet копируются deepcopy
+    return tag_catalogue.slug_choices()
 
 
 class RecipeFilter(FilterSet):
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    tags = filters.MultipleChoiceFilter(
+        choices=tag_slug_choices, method='filter_tags'
+    )
+    # any - рецепты с любым из тегов, all - со всеми
+    tags_mode = filters.ChoiceFilter(
+        choices=TAG_MODES, method='filter_tags_mode'
+    )
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
+    search = filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('tags', 'tags_mode', 'author', 'is_favorited',
+                  'is_in_shopping_cart', 'search')
+
+    def filter_tags(self, queryset, name, value):
+        # id из каталога тегов: без JOIN с таблицей тегов
+        slugs = set(value)
+        tag_ids = [tag.id for tag in tag_catalogue.all() if tag.slug in slugs]
+        match_all = self.form.cleaned_data.get('tags_mode') == 'all'
+        if match_all and len(tag_ids) < len(slugs):
+            return queryset.none()
+        return queryset.with_tags(tag_ids, match_all)
+
+    def filter_tags_mode(self, queryset, name, value):
+        # учитывается в filter_tags
+        return queryset
 
     def filter_is_favorited(self, queryset, name, value):
         if value:
@@ -28,3 +53,8 @@ class RecipeFilter(FilterSet):
         if value:
             return queryset.filter(shopping_cart__user=self.request.user)  # type: ignore
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        if value.strip():
+            return queryset.search(value)
+        return queryset
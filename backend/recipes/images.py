@@ -0,0 +1,198 @@
+import io
+import logging
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .cache import RECIPES, bump_versions, recipe_version
+from .models import Recipe
+from .storage import recipe_image_storage
+
+logger = logging.getLogger(__name__)
+
+IMAGE_DIR = 'recipes'
+THUMBNAIL_DIR = f'{IMAGE_DIR}/thumbnails'
+METADATA_KEYS = {'exif', 'xmp', 'XML:com.adobe.xmp', 'comment'}
+THUMBNAIL_FORMATS = (
+    ('jpeg', 'jpg', {'quality': 85, 'optimize': True, 'progressive': True}),
+    ('webp', 'webp', {'quality': 80, 'method': 4}),
+)
+
+
+def thumbnail_name(image_name, size, extension):
+    """имя миниатюры выводится из имени оригинала и не меняется"""
+    stem = posixpath.splitext(posixpath.basename(image_name))[0]
+    return f'{THUMBNAIL_DIR}/{stem}-{size}.{extension}'
+
+
+def thumbnail_names(image_name):
+    return {
+        size: {
+            image_format: thumbnail_name(image_name, size, extension)
+            for image_format, extension, _ in THUMBNAIL_FORMATS
+        }
+        for size in settings.RECIPE_THUMBNAIL_SIZES
+    }
+
+
+def is_processed(recipe):
+    return bool(recipe.image) and recipe.processed_image == recipe.image.name
+
+
+def is_current_image(recipe, file):
+    """
+    Загружен тот же файл, что уже у рецепта: его обработанная версия
+    или исходный файл, из которого она получена.
+    """
+    if not recipe.image:
+        return False
+    field = recipe._meta.get_field('image')
+    name = recipe_image_storage.content_name(
+        field.generate_filename(recipe, file.name), file
+    )
+    # original_image относится к изображению, только пока оно обработано
+    return name == recipe.image.name or (
+        is_processed(recipe) and name == recipe.original_image
+    )
+
+
+def encode(image, image_format, **options):
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, **options)
+    return buffer.getvalue()
+
+
+def replace(name, content):
+    """перезаписывает файл, сохраняя имя, а значит и URL"""
+    default_storage.delete(name)
+    default_storage.save(name, ContentFile(content))
+
+
+def process_image(name):
+    """
+    Уменьшает слишком большой оригинал, убирает из него метаданные
+    и строит миниатюры всех размеров в JPEG и WebP. Измененное
+    изображение сохраняется новым файлом со своим хешем, оригинал
+    не трогается: его могут использовать другие рецепты. Возвращает
+    имя итогового файла.
+    """
+    with recipe_image_storage.open(name) as file:
+        image = Image.open(file)
+        original_format = image.format
+        original_size = image.size
+        has_metadata = bool(METADATA_KEYS & set(image.info))
+        # цветовой профиль - не метаданные, без него изменятся цвета
+        icc_profile = image.info.get('icc_profile')
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    max_size = settings.RECIPE_IMAGE_MAX_SIZE
+    image.thumbnail((max_size, max_size))
+    if has_metadata or image.size != original_size:
+        # Pillow не переносит EXIF, если не передать его явно
+        options = {'icc_profile': icc_profile} if icc_profile else {}
+        name = recipe_image_storage.save(
+            posixpath.join(IMAGE_DIR, posixpath.basename(name)),
+            ContentFile(encode(image, original_format or 'PNG', **options)),
+        )
+
+    rgb = image.convert('RGB')
+    for size, side in settings.RECIPE_THUMBNAIL_SIZES.items():
+        thumbnail = rgb.copy()
+        thumbnail.thumbnail((side, side))
+        for image_format, extension, options in THUMBNAIL_FORMATS:
+            replace(
+                thumbnail_name(name, size, extension),
+                encode(thumbnail, image_format, **options),
+            )
+    return name
+
+
+def use_processed(name, processed):
+    """
+    Переводит на обработанный файл все рецепты с изображением name.
+    Рецепты, где изображение успели заменить, не меняются.
+    """
+    recipe_ids = list(
+        Recipe.objects.filter(image=name).values_list('id', flat=True)
+    )
+    updated = Recipe.objects.filter(id__in=recipe_ids, image=name).update(
+        image=processed, processed_image=processed,
+        # повторная обработка (--all) не меняет исходный файл
+        original_image=Case(
+            When(processed_image=name, then=F('original_image')),
+            default=Value(name if processed != name else ''),
+        ),
+        updated_at=timezone.now(),
+    )
+    if updated:
+        bump_versions(RECIPES, *map(recipe_version, recipe_ids))
+    return updated
+
+
+def process_recipe_image(recipe_id):
+    """обрабатывает текущее изображение рецепта, если еще не обработано"""
+    recipe = Recipe.objects.filter(pk=recipe_id).only(
+        'image', 'processed_image'
+    ).first()
+    if recipe is None or not recipe.image or is_processed(recipe):
+        return False
+    name = recipe.image.name
+    # один файл у нескольких рецептов: он уже обработан
+    if Recipe.objects.filter(image=name, processed_image=name).exists():
+        processed = name
+    else:
+        processed = process_image(name)
+    return bool(use_processed(name, processed))
+
+
+class ImagePipeline:
+    """
+    Пул потоков, обрабатывающий изображения рецептов вне запроса.
+    Задача ставится после фиксации транзакции; то, что не успел
+    обработать остановленный процесс, доделывает команда
+    process_recipe_images.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get_executor(self):
+        # пул создается в рабочем процессе, уже после fork
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=settings.IMAGE_PROCESSING_WORKERS,
+                    thread_name_prefix='recipe-images',
+                )
+        return self._executor
+
+    def schedule(self, recipe_id):
+        # без рабочих потоков изображения обрабатывает только команда
+        if not settings.IMAGE_PROCESSING_WORKERS:
+            return
+        transaction.on_commit(
+            lambda: self._get_executor().submit(self._run, recipe_id)
+        )
+
+    @staticmethod
+    def _run(recipe_id):
+        try:
+            process_recipe_image(recipe_id)
+        except Exception:
+            logger.exception(
+                'Не удалось обработать изображение рецепта %s', recipe_id
+            )
+        finally:
+            connections.close_all()
+
+
+image_pipeline = ImagePipeline()
@@ -0,0 +1,93 @@
+import bisect
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+
+from .models import Ingredient
+
+IndexState = namedtuple(
+    'IndexState', 'keys rows expires_at count updated_at'
+)
+
+
+class IngredientIndex:
+    """
+    Индекс названий ингредиентов в памяти процесса для автодополнения.
+    Строится лениво при первом поиске, сбрасывается сигналами при
+    сохранении и удалении ингредиента. Сигналы видит только свой процесс,
+    поэтому индекс дополнительно перестраивается раз в
+    INGREDIENT_INDEX_TTL секунд.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+
+    def invalidate(self):
+        self._index = None
+
+    def _get(self):
+        index = self._index
+        if index is not None and time.monotonic() < index.expires_at:
+            return index
+        with self._lock:
+            index = self._index
+            if index is None or time.monotonic() >= index.expires_at:
+                index = self._build()
+                self._index = index
+        return index
+
+    @staticmethod
+    def _build():
+        ingredients = list(Ingredient.objects.values_list(
+            'id', 'name', 'measurement_unit', 'updated_at'
+        ))
+        rows = sorted(
+            (
+                (name.lower(), {
+                    'id': pk, 'name': name, 'measurement_unit': unit,
+                })
+                for pk, name, unit, _ in ingredients
+            ),
+            key=lambda row: row[0],
+        )
+        return IndexState(
+            keys=[row[0] for row in rows],
+            rows=[row[1] for row in rows],
+            expires_at=time.monotonic() + settings.INGREDIENT_INDEX_TTL,
+            count=len(ingredients),
+            updated_at=max(
+                (row[3] for row in ingredients), default=None
+            ),
+        )
+
+    def state(self):
+        """число ингредиентов и время последнего изменения в индексе"""
+        index = self._get()
+        return index.count, index.updated_at
+
+    def search(self, query, limit=None):
+        """
+        Сначала точное совпадение, затем названия, начинающиеся с query,
+        затем содержащие query. Точное совпадение в отсортированном списке
+        стоит первым среди названий с этим началом.
+        """
+        limit = limit or settings.INGREDIENT_SEARCH_LIMIT
+        query = query.strip().lower()
+        index = self._get()
+        keys, rows = index.keys, index.rows
+        start = bisect.bisect_left(keys, query)
+        end = bisect.bisect_left(keys, query + '\uffff', lo=start)
+        result = rows[start:min(end, start + limit)]
+        if len(result) < limit:
+            for key, row in zip(keys, rows):
+                if query in key and not key.startswith(query):
+                    result.append(row)
+                    if len(result) == limit:
+                        break
+        return result
+
+
+ingredient_index = IngredientIndex()
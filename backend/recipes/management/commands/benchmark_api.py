@@ -0,0 +1,346 @@
+import base64
+import io
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from contextlib import ExitStack
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test.utils import (CaptureQueriesContext, override_settings,
+                               setup_databases, setup_test_environment,
+                               teardown_databases, teardown_test_environment)
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.counters import reconcile_counters
+from recipes.ingredient_index import ingredient_index
+from recipes.models import (Favorite, Ingredient, Recipe, ShoppingCart,
+                            ShoppingListItem, Tag)
+from recipes.tag_catalogue import tag_catalogue
+from users.authentication import token_cache
+from users.models import Follow, User
+
+BENCH_PASSWORD = 'bench-password'
+
+
+def small_png_base64():
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), '#E26C2D').save(buffer, format='PNG')
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/png;base64,{encoded}'
+
+
+class Command(BaseCommand):
+    """
+    Замеряем количество SQL-запросов, суммарное время SQL и время ответа
+    для всех эндпоинтов API на нескольких объемах данных.
+    Команда работает на отдельной тестовой БД и не трогает рабочие данные:
+    python manage.py benchmark_api --scales 100,500,2000
+    Завершается с ошибкой, если число запросов списка растет вместе
+    с размером страницы или с объемом данных. С --explain печатает
+    планы запросов фильтра по тегам на наибольшем объеме.
+    """
+    help = 'Benchmark query count and latency of every API endpoint.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scales', default='100,500,2000',
+            help='Количества рецептов в наборах данных, через запятую.'
+        )
+        parser.add_argument(
+            '--page-sizes', default='6,50',
+            help='Значения limit для списковых эндпоинтов, через запятую.'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=3,
+            help='Сколько раз повторять каждый запрос.'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=42,
+            help='Зерно генератора случайных данных.'
+        )
+        parser.add_argument(
+            '--explain', action='store_true',
+            help='Показать планы запросов фильтра по тегам.'
+        )
+
+    def handle(self, *args, **options):
+        scales = self.parse_ints(options['scales'])
+        page_sizes = self.parse_ints(options['page_sizes'])
+        if min(scales) < max(page_sizes):
+            raise CommandError(
+                'Наименьший объем данных должен быть не меньше '
+                'наибольшего размера страницы.'
+            )
+        self.max_page_size = max(page_sizes)
+        self.repeat = options['repeat']
+        self.seed_value = options['seed']
+        self.random = random.Random(self.seed_value)
+        self.image = small_png_base64()
+        self.results = {}
+
+        media_root = tempfile.mkdtemp(prefix='foodgram-bench-')
+        setup_test_environment()
+        # тестовая БД, реплика из DATABASES становится ее зеркалом
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            # изображения обрабатываются вне запроса и в замер не входят
+            with override_settings(MEDIA_ROOT=media_root,
+                                   IMAGE_PROCESSING_WORKERS=0):
+                for scale in scales:
+                    call_command('flush', interactive=False, verbosity=0)
+                    self.seed(scale)
+                    self.run_scale(scale, page_sizes)
+                if options['explain']:
+                    self.explain_tags(self.max_page_size)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        self.report(scales)
+        failures = self.find_growth(scales)
+        if failures:
+            raise CommandError(
+                'Число запросов растет:\n' + '\n'.join(failures)
+            )
+        self.stdout.write(self.style.SUCCESS('Рост числа запросов не найден.'))
+
+    @staticmethod
+    def parse_ints(value):
+        return sorted({int(item) for item in value.split(',') if item})
+
+    def seed(self, scale):
+        """наполняет БД через seed_foodgram и добавляет пользователя замера"""
+        call_command(
+            'seed_foodgram', users=max(scale // 5, self.max_page_size),
+            recipes=scale, seed=self.seed_value, prefix='bench',
+            stdout=io.StringIO(),
+        )
+        self.ingredient_ids = list(
+            Ingredient.objects.values_list('id', flat=True)
+        )
+        self.user = User.objects.create_user(
+            username='bench', email='bench@foodgram.ru',
+            password=BENCH_PASSWORD,
+        )
+        self.token = Token.objects.create(user=self.user).key
+        Follow.objects.bulk_create(
+            Follow(user=self.user, author=author)
+            for author in User.objects.exclude(id=self.user.id)
+        )
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        chosen = recipe_ids[::3]
+        Favorite.objects.bulk_create(
+            Favorite(user=self.user, recipe_id=recipe_id)
+            for recipe_id in chosen
+        )
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=self.user, recipe_id=recipe_id)
+            for recipe_id in chosen
+        )
+        ShoppingListItem.objects.rebuild([self.user.id])
+        reconcile_counters()
+        # bulk_create в seed_foodgram минует сигналы: каталоги в памяти
+        # сбрасываются и прогреваются до замеров
+        tag_catalogue.invalidate()
+        ingredient_index.invalidate()
+        tag_catalogue.all()
+        ingredient_index.state()
+        self.recipe = Recipe.objects.select_related('author').first()
+        self.author = self.recipe.author
+        self.free_recipe = Recipe.objects.exclude(id__in=chosen).first()
+
+    def measure(self, scale, name, method, url, data=None, status=200,
+                client=None, warm=False):
+        """по умолчанию замер без кеша ответов, warm=True - из кеша"""
+        client = client or self.client
+        if not warm:
+            cache.clear()
+        # запросы к реплике считаются вместе с запросами к основной БД
+        with ExitStack() as stack:
+            contexts = [
+                stack.enter_context(CaptureQueriesContext(connections[alias]))
+                for alias in connections
+            ]
+            started = time.perf_counter()
+            response = getattr(client, method)(url, data, format='json')
+            if response.streaming:
+                b''.join(response.streaming_content)
+            wall = time.perf_counter() - started
+        if response.status_code != status:
+            raise CommandError(
+                f'{method.upper()} {url}: ожидался {status}, '
+                f'получен {response.status_code}'
+            )
+        queries = [
+            query for context in contexts for query in context.captured_queries
+        ]
+        sql = sum(float(query['time']) for query in queries)
+        self.results.setdefault((scale, name), []).append(
+            (len(queries), sql * 1000, wall * 1000)
+        )
+        return response
+
+    def recipe_payload(self, suffix):
+        ingredients = self.random.sample(self.ingredient_ids, 5)
+        return {
+            'name': f'Замер {suffix}',
+            'text': 'Рецепт для замера производительности',
+            'cooking_time': 30,
+            'image': self.image,
+            'tags': list(Tag.objects.values_list('id', flat=True)[:2]),
+            'ingredients': [
+                {'id': ingredient_id, 'amount': 100}
+                for ingredient_id in ingredients
+            ],
+        }
+
+    def run_scale(self, scale, page_sizes):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+        # токен попадает в кеш авторизации до замеров
+        token_cache.clear()
+        self.client.get('/api/users/me/')
+        anonymous = APIClient()
+        recipe = self.recipe.id
+        free_recipe = self.free_recipe.id
+        author = self.author.id
+        tag = Tag.objects.first()
+        tags = '&'.join(
+            f'tags={slug}'
+            for slug in Tag.objects.values_list('slug', flat=True)[:2]
+        )
+
+        for attempt in range(self.repeat):
+            for limit in page_sizes:
+                self.measure(scale, f'recipes-list[{limit}]', 'get',
+                             f'/api/recipes/?limit={limit}')
+                self.measure(scale, f'recipes-list-cached[{limit}]', 'get',
+                             f'/api/recipes/?limit={limit}', warm=True)
+                self.measure(scale, f'recipes-list-cursor[{limit}]', 'get',
+                             f'/api/recipes/?limit={limit}&cursor=')
+                self.measure(scale, f'recipes-list-anonymous[{limit}]',
+                             'get', f'/api/recipes/?limit={limit}',
+                             client=anonymous)
+                self.measure(scale, f'recipes-list-filtered[{limit}]', 'get',
+                             f'/api/recipes/?limit={limit}&tags={tag.slug}'
+                             f'&is_favorited=1')
+                self.measure(scale, f'recipes-list-tags-any[{limit}]', 'get',
+                             f'/api/recipes/?limit={limit}&{tags}')
+                self.measure(scale, f'recipes-list-tags-all[{limit}]', 'get',
+                             f'/api/recipes/?limit={limit}&{tags}'
+                             f'&tags_mode=all')
+                self.measure(scale, f'subscriptions[{limit}]', 'get',
+                             f'/api/users/subscriptions/?limit={limit}'
+                             f'&recipes_limit=3')
+            self.measure(scale, 'recipes-detail', 'get',
+                         f'/api/recipes/{recipe}/')
+            self.measure(scale, 'tags-list', 'get', '/api/tags/')
+            self.measure(scale, 'tags-detail', 'get', f'/api/tags/{tag.id}/')
+            self.measure(scale, 'ingredients-search', 'get',
+                         '/api/ingredients/?name=сах')
+            self.measure(scale, 'users-me', 'get', '/api/users/me/')
+            self.measure(scale, 'download-shopping-cart', 'get',
+                         '/api/recipes/download_shopping_cart/')
+
+            self.measure(scale, 'favorite-add', 'post',
+                         f'/api/recipes/{free_recipe}/favorite/', status=201)
+            self.measure(scale, 'favorite-remove', 'delete',
+                         f'/api/recipes/{free_recipe}/favorite/', status=204)
+            self.measure(scale, 'shopping-cart-add', 'post',
+                         f'/api/recipes/{free_recipe}/shopping_cart/',
+                         status=201)
+            self.measure(scale, 'shopping-cart-remove', 'delete',
+                         f'/api/recipes/{free_recipe}/shopping_cart/',
+                         status=204)
+            self.measure(scale, 'unsubscribe', 'delete',
+                         f'/api/users/{author}/subscribe/', status=204)
+            self.measure(scale, 'subscribe', 'post',
+                         f'/api/users/{author}/subscribe/?recipes_limit=3',
+                         status=201)
+
+            created = self.measure(
+                scale, 'recipes-create', 'post', '/api/recipes/',
+                self.recipe_payload(f'{scale}-{attempt}'), status=201
+            ).data['id']
+            self.measure(scale, 'recipes-update', 'patch',
+                         f'/api/recipes/{created}/',
+                         self.recipe_payload(f'{scale}-{attempt}-edit'))
+            self.measure(scale, 'recipes-delete', 'delete',
+                         f'/api/recipes/{created}/', status=204)
+
+    def explain_tags(self, limit):
+        """планы страницы и COUNT(*) пагинатора для обоих режимов"""
+        tag_ids = list(Tag.objects.values_list('id', flat=True)[:2])
+        prefix = connection.ops.explain_query_prefix()
+        for match_all in (False, True):
+            queryset = Recipe.objects.with_tags(tag_ids, match_all)
+            mode = 'all' if match_all else 'any'
+            self.stdout.write(f'tags_mode={mode}, страница:')
+            self.stdout.write(queryset.order_by('-id')[:limit].explain())
+            sql, params = queryset.values('pk').query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'{prefix} SELECT COUNT(*) FROM ({sql}) AS subquery',
+                    params,
+                )
+                plan = '\n'.join(
+                    ' '.join(map(str, row)) for row in cursor.fetchall()
+                )
+            self.stdout.write(f'tags_mode={mode}, COUNT(*):')
+            self.stdout.write(plan)
+
+    def report(self, scales):
+        names = sorted({name for _, name in self.results})
+        header = f'{"endpoint":<36}' + ''.join(
+            f'{f"n={scale} q / sql ms / ms":>28}' for scale in scales
+        )
+        self.stdout.write(header)
+        for name in names:
+            line = f'{name:<36}'
+            for scale in scales:
+                queries, sql, wall = self.summary(scale, name)
+                line += f'{f"{queries} / {sql:.1f} / {wall:.1f}":>28}'
+            self.stdout.write(line)
+
+    def summary(self, scale, name):
+        samples = self.results[(scale, name)]
+        return (
+            max(sample[0] for sample in samples),
+            statistics.median(sample[1] for sample in samples),
+            statistics.median(sample[2] for sample in samples),
+        )
+
+    def find_growth(self, scales):
+        failures = []
+        names = sorted({name for _, name in self.results})
+        for scale in scales:
+            groups = {}
+            for name in names:
+                if '[' in name:
+                    groups.setdefault(name.split('[')[0], []).append(name)
+            for group, members in groups.items():
+                counts = {
+                    member: self.summary(scale, member)[0]
+                    for member in members
+                }
+                if len(set(counts.values())) > 1:
+                    failures.append(
+                        f'{group} при n={scale} зависит от limit: {counts}'
+                    )
+        for name in names:
+            counts = {
+                scale: self.summary(scale, name)[0] for scale in scales
+            }
+            if len(set(counts.values())) > 1:
+                failures.append(
+                    f'{name} зависит от объема данных: {counts}'
+                )
+        return failures
@@ -0,0 +1,180 @@
+import io
+import statistics
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F, Value
+from django.test.utils import (override_settings, setup_databases,
+                               setup_test_environment, teardown_databases,
+                               teardown_test_environment)
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from backend.renderers import FastJSONRenderer
+from recipes.fast_serializers import (FastIngredientSerializer,
+                                      FastRecipeSerializer)
+from recipes.models import Ingredient, Recipe
+from recipes.serializers import IngredientSerializer, RecipeSerializer
+from users.models import Follow, User
+from users.serializers import FastFollowSerializer, FollowSerializer
+from users.views import FollowListAPIView
+
+
+class Command(BaseCommand):
+    """
+    Сравниваем быстрые сериализаторы с сериализаторами DRF:
+    python manage.py benchmark_serializers --recipes 2000
+    Для каждого ответа (списки рецептов, рецепт, подписки, ингредиенты)
+    JSON обоих путей должен совпадать байт в байт, иначе команда
+    завершается с ошибкой. Время - сериализация и рендеринг уже
+    загруженных объектов; для ингредиентов - вместе с запросом,
+    потому что быстрый путь читает строки через .values().
+    Команда работает на отдельной тестовой БД.
+    """
+    help = 'Check byte parity and speed of the fast read serializers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=2000)
+        parser.add_argument(
+            '--page-sizes', default='6,50',
+            help='Значения limit для списков, через запятую.'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Сколько раз повторять каждый замер.'
+        )
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        page_sizes = sorted(
+            {int(item) for item in options['page_sizes'].split(',') if item}
+        )
+        self.repeat = options['repeat']
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with override_settings(IMAGE_PROCESSING_WORKERS=0):
+                self.seed(options['recipes'], options['seed'])
+                results = [
+                    self.compare(*case) for case in self.cases(page_sizes)
+                ]
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        self.report(results)
+        mismatches = [name for name, equal, *_ in results if not equal]
+        if mismatches:
+            raise CommandError(
+                'JSON не совпадает: ' + ', '.join(mismatches)
+            )
+        self.stdout.write(self.style.SUCCESS('JSON совпадает байт в байт.'))
+
+    def seed(self, recipes, seed):
+        call_command(
+            'seed_foodgram', users=max(recipes // 5, 50), recipes=recipes,
+            seed=seed, prefix='bench', stdout=io.StringIO(),
+        )
+        # половина рецептов - с миниатюрами, чтобы сравнить и их
+        Recipe.objects.filter(
+            id__in=Recipe.objects.values_list('id', flat=True)[::2]
+        ).update(processed_image=F('image'))
+        self.user = User.objects.create_user(
+            username='bench', email='bench@foodgram.ru',
+            password='bench-password',
+        )
+        Follow.objects.bulk_create(
+            Follow(user=self.user, author=author)
+            for author in User.objects.filter(recipes_count__gt=0)
+        )
+
+    def request(self, url):
+        request = Request(APIRequestFactory().get(url))
+        request.user = self.user
+        return request
+
+    def cases(self, page_sizes):
+        """имя, функция пути DRF и функция быстрого пути"""
+        recipes = Recipe.objects.with_related().with_user_flags(
+            self.user
+        ).order_by('-id')
+        for limit in page_sizes:
+            page = list(recipes[:limit])
+            request = self.request(f'/api/recipes/?limit={limit}')
+            yield (
+                f'recipes-list[{limit}]',
+                self.drf(RecipeSerializer, page, request, many=True),
+                self.fast(FastRecipeSerializer, page, request, many=True),
+            )
+
+            authors = list(User.objects.filter(
+                following__user=self.user
+            ).annotate(is_subscribed=Value(True)).order_by('-id')[:limit])
+            FollowListAPIView.attach_recipes(authors, 3)
+            request = self.request(
+                f'/api/users/subscriptions/?limit={limit}&recipes_limit=3'
+            )
+            yield (
+                f'subscriptions[{limit}]',
+                self.drf(FollowSerializer, authors, request, many=True),
+                self.fast(FastFollowSerializer, authors, request, many=True),
+            )
+
+        recipe = recipes.first()
+        request = self.request(f'/api/recipes/{recipe.id}/')
+        yield (
+            'recipes-detail',
+            self.drf(RecipeSerializer, recipe, request),
+            self.fast(FastRecipeSerializer, recipe, request),
+        )
+
+        request = self.request('/api/ingredients/')
+        yield (
+            'ingredients-list',
+            lambda: JSONRenderer().render(IngredientSerializer(
+                Ingredient.objects.all(), many=True
+            ).data),
+            lambda: FastJSONRenderer().render(FastIngredientSerializer(
+                Ingredient.objects.values(*FastIngredientSerializer.fields),
+                many=True,
+            ).data),
+        )
+
+    @staticmethod
+    def drf(serializer_class, instance, request, many=False):
+        context = {'request': request}
+        return lambda: JSONRenderer().render(
+            serializer_class(instance, many=many, context=context).data
+        )
+
+    @staticmethod
+    def fast(serializer_class, instance, request, many=False):
+        context = {'request': request}
+        return lambda: FastJSONRenderer().render(
+            serializer_class(instance, many=many, context=context).data
+        )
+
+    def compare(self, name, drf, fast):
+        equal = drf() == fast()
+        return (name, equal, self.time(drf), self.time(fast))
+
+    def time(self, render):
+        samples = []
+        for _ in range(self.repeat):
+            started = time.perf_counter()
+            render()
+            samples.append(time.perf_counter() - started)
+        return statistics.median(samples) * 1000
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"response":<24}{"parity":>8}{"drf ms":>10}'
+            f'{"fast ms":>10}{"speedup":>10}'
+        )
+        for name, equal, drf, fast in results:
+            self.stdout.write(
+                f'{name:<24}{"ok" if equal else "DIFF":>8}{drf:>10.2f}'
+                f'{fast:>10.2f}{drf / fast:>9.1f}x'
+            )
@@ -0,0 +1,240 @@
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Follow, User
+
+BENCH_USERNAME = 'bench-server'
+MODES = ('wsgi', 'asgi')
+
+
+class Command(BaseCommand):
+    """
+    Сравниваем режимы WSGI и ASGI. Для каждого режима команда запускает
+    gunicorn -c gunicorn.conf.py с одним рабочим процессом и шлет
+    параллельные запросы избранного, корзины, подписки и скачивания
+    списка покупок, пока несколько медленных клиентов по байту
+    передают свои запросы:
+    python manage.py benchmark_servers --concurrency 20 --requests 400
+    Работает с БД из настроек (лучше PostgreSQL - SQLite плохо
+    переносит параллельные записи): создает пользователя bench-server
+    и удаляет его после замера.
+    """
+    help = 'Compare sync WSGI and ASGI gunicorn workers under concurrency.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', default=','.join(MODES))
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument(
+            '--requests', type=int, default=400,
+            help='Число запросов в каждом режиме.'
+        )
+        parser.add_argument(
+            '--slow-clients', type=int, default=2,
+            help='Сколько клиентов медленно передают запрос.'
+        )
+        parser.add_argument(
+            '--slow-seconds', type=float, default=2,
+            help='За сколько секунд медленный клиент передает запрос.'
+        )
+        parser.add_argument('--port', type=int, default=8765)
+
+    def handle(self, *args, **options):
+        modes = [mode for mode in options['modes'].split(',') if mode]
+        unknown = set(modes) - set(MODES)
+        if unknown:
+            raise CommandError(f'Неизвестные режимы: {unknown}')
+        self.options = options
+        self.setup_user(options['concurrency'])
+        results = {}
+        try:
+            for mode in modes:
+                self.reset_user()
+                server = self.start_server(mode)
+                try:
+                    results[mode] = self.run_load()
+                finally:
+                    server.terminate()
+                    server.wait(timeout=30)
+        finally:
+            User.objects.filter(username=BENCH_USERNAME).delete()
+        self.report(results)
+        failed = [mode for mode, result in results.items() if result['errors']]
+        if failed:
+            raise CommandError(
+                'Ошибки в ответах в режимах: ' + ', '.join(failed)
+            )
+
+    def setup_user(self, concurrency):
+        User.objects.filter(username=BENCH_USERNAME).delete()
+        self.user = User.objects.create_user(
+            username=BENCH_USERNAME, email='bench-server@foodgram.ru',
+            password='bench-password',
+        )
+        self.token = Token.objects.create(user=self.user).key
+        # у каждого клиента свой рецепт и свой автор: переключения
+        # разных клиентов не мешают друг другу
+        self.recipe_ids = list(
+            Recipe.objects.order_by('id').values_list('id', flat=True)
+            [:concurrency]
+        )
+        self.author_ids = list(User.objects.exclude(
+            id=self.user.id
+        ).order_by('id').values_list('id', flat=True)[:concurrency])
+        if len(self.recipe_ids) < concurrency:
+            raise CommandError(
+                'Рецептов меньше, чем --concurrency, '
+                'наполните БД командой seed_foodgram.'
+            )
+
+    def reset_user(self):
+        """
+        каждый режим начинает с пустых избранного, корзины и подписок:
+        клиент может закончить прошлый режим на середине цикла
+        """
+        Favorite.objects.filter(user=self.user).delete()
+        ShoppingCart.objects.filter(user=self.user).delete()
+        Follow.objects.filter(user=self.user).delete()
+
+    def start_server(self, mode):
+        port = self.options['port']
+        env = {
+            **os.environ,
+            'SERVER_MODE': mode,
+            'GUNICORN_BIND': f'127.0.0.1:{port}',
+            'GUNICORN_WORKERS': '1',
+        }
+        server = subprocess.Popen(
+            ['gunicorn', '-c', 'gunicorn.conf.py'], cwd=settings.BASE_DIR,
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'gunicorn в режиме {mode} не запустился.')
+            try:
+                if self.request('GET', '/api/tags/')[0] == 200:
+                    return server
+            except OSError:
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError(f'gunicorn в режиме {mode} не ответил за 30 с.')
+
+    def request(self, method, path):
+        connection = http.client.HTTPConnection(
+            '127.0.0.1', self.options['port'], timeout=60
+        )
+        try:
+            connection.request(method, path, headers={
+                'Authorization': f'Token {self.token}',
+            })
+            response = connection.getresponse()
+            return response.status, response.read()
+        finally:
+            connection.close()
+
+    def slow_client(self, stop):
+        """передает запрос по байту, занимая соединение"""
+        request = (
+            f'GET /api/tags/ HTTP/1.1\r\nHost: 127.0.0.1\r\n'
+            f'Authorization: Token {self.token}\r\n\r\n'
+        ).encode()
+        delay = self.options['slow_seconds'] / len(request)
+        while not stop.is_set():
+            try:
+                with socket.create_connection(
+                        ('127.0.0.1', self.options['port']),
+                        timeout=60) as sock:
+                    for byte in request:
+                        sock.sendall(bytes([byte]))
+                        time.sleep(delay)
+                    sock.recv(65536)
+            except OSError:
+                return
+
+    def client(self, index, count):
+        """
+        переключает избранное, корзину и подписку туда и обратно
+        и скачивает список покупок
+        """
+        recipe = self.recipe_ids[index]
+        paths = [
+            f'/api/recipes/{recipe}/favorite/',
+            f'/api/recipes/{recipe}/shopping_cart/',
+        ]
+        if index < len(self.author_ids):
+            paths.append(f'/api/users/{self.author_ids[index]}/subscribe/')
+        steps = [
+            step for path in paths
+            for step in (('POST', path, 201), ('DELETE', path, 204))
+        ]
+        steps.append(('GET', '/api/recipes/download_shopping_cart/', 200))
+        samples, errors = [], 0
+        for number in range(count):
+            method, path, expected = steps[number % len(steps)]
+            started = time.perf_counter()
+            try:
+                status, body = self.request(method, path)
+            except (OSError, http.client.HTTPException):
+                status, body = None, b''
+            samples.append(time.perf_counter() - started)
+            # потоковый ответ, оборванный на середине, приходит с кодом 200:
+            # список покупок должен дойти до последней строки
+            if status != expected or (
+                    method == 'GET'
+                    and not body.endswith(settings.FOODGRAM.encode())):
+                errors += 1
+        return samples, errors
+
+    def run_load(self):
+        concurrency = self.options['concurrency']
+        per_client = max(self.options['requests'] // concurrency, 2)
+        stop = threading.Event()
+        slow = [
+            threading.Thread(target=self.slow_client, args=(stop,),
+                             daemon=True)
+            for _ in range(self.options['slow_clients'])
+        ]
+        for thread in slow:
+            thread.start()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(
+                self.client, range(concurrency), [per_client] * concurrency
+            ))
+        wall = time.perf_counter() - started
+        stop.set()
+        samples = sorted(
+            sample for client_samples, _ in results
+            for sample in client_samples
+        )
+        return {
+            'requests': len(samples),
+            'errors': sum(errors for _, errors in results),
+            'rps': len(samples) / wall,
+            'p50': statistics.median(samples) * 1000,
+            'p95': samples[int(len(samples) * 0.95) - 1] * 1000,
+            'max': samples[-1] * 1000,
+        }
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"mode":<8}{"requests":>10}{"errors":>8}{"req/s":>10}'
+            f'{"p50 ms":>10}{"p95 ms":>10}{"max ms":>10}'
+        )
+        for mode, result in results.items():
+            self.stdout.write(
+                f'{mode:<8}{result["requests"]:>10}{result["errors"]:>8}'
+                f'{result["rps"]:>10.1f}{result["p50"]:>10.1f}'
+                f'{result["p95"]:>10.1f}{result["max"]:>10.1f}'
+            )
@@ -0,0 +1,85 @@
+import posixpath
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.utils import timezone
+
+from recipes.images import IMAGE_DIR, THUMBNAIL_DIR
+from recipes.models import Recipe
+from recipes.storage import recipe_image_storage
+
+
+def walk(storage, path):
+    """все файлы каталога хранилища, с подкаталогами"""
+    if not storage.exists(path):
+        return
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield posixpath.join(path, name)
+    for directory in directories:
+        yield from walk(storage, posixpath.join(path, directory))
+
+
+def stem(name):
+    return posixpath.splitext(posixpath.basename(name))[0]
+
+
+class Command(BaseCommand):
+    """
+    Удаляем изображения рецептов, на которые не ссылается ни один рецепт,
+    вместе с их миниатюрами. Число ссылок на файл считается по рецептам
+    в момент сборки. Файлы моложе --min-age часов не трогаем: их могла
+    только что сохранить еще не завершенная транзакция.
+    python manage.py collect_recipe_images --dry-run
+    """
+    help = 'Delete recipe images and thumbnails no recipe refers to.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age', type=float, default=24,
+            help='Минимальный возраст удаляемого файла, часов.'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что будет удалено.'
+        )
+
+    def handle(self, *args, **options):
+        references = dict(
+            Recipe.objects.exclude(image='').order_by().values_list(
+                'image'
+            ).annotate(references=Count('id'))
+        )
+        referenced_stems = {stem(name) for name in references}
+        threshold = timezone.now() - timedelta(hours=options['min_age'])
+
+        garbage = [
+            (recipe_image_storage, name)
+            for name in walk(recipe_image_storage, IMAGE_DIR)
+            if not name.startswith(THUMBNAIL_DIR + '/')
+            and name not in references
+        ]
+        garbage += [
+            (default_storage, name)
+            for name in walk(default_storage, THUMBNAIL_DIR)
+            if stem(name).rsplit('-', 1)[0] not in referenced_stems
+        ]
+
+        deleted = freed = 0
+        for storage, name in garbage:
+            if storage.get_modified_time(name) > threshold:
+                continue
+            size = storage.size(name)
+            if options['dry_run']:
+                self.stdout.write(name)
+            else:
+                storage.delete(name)
+            deleted += 1
+            freed += size
+        self.stdout.write(self.style.SUCCESS(
+            f'Файлов в использовании: {len(references)}, '
+            f'{"к удалению" if options["dry_run"] else "удалено"}: '
+            f'{deleted}, {freed / 1024 / 1024:.1f} МБ'
+        ))
@@ -1,29 +1,209 @@
+import io
+import json
+import re
+import sys
+import time
 from csv import reader
+from itertools import islice
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
+from recipes.cache import CATALOGUE, bump_versions
+from recipes.ingredient_index import ingredient_index
 from recipes.models import Ingredient
 
+DEFAULT_PATH = 'recipes/data/ingredients.csv'
+FORMATS = ('csv', 'json', 'jsonl')
+CHUNK_SIZE = 64 * 1024
+# недоразобранный элемент длиннее - ошибка, а не конец прочитанной части
+MAX_ITEM_SIZE = 1024 * 1024
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+def csv_rows(file):
+    for row in reader(file):
+        yield row[:2] if len(row) == 2 else None
+
+
+def json_rows(file):
+    """массив объектов {"name": ..., "measurement_unit": ...}"""
+    for item in json_array_items(file):
+        yield item_row(item)
+
+
+def json_array_items(file):
+    """
+    Элементы JSON-массива по одному: файл читается частями
+    по CHUNK_SIZE, JSONDecoder.raw_decode разбирает элементы из буфера,
+    в котором остается только еще не разобранный текст.
+    """
+    decoder = json.JSONDecoder()
+    buffer, position, state = '', 0, 'start'
+    while True:
+        position = WHITESPACE.match(buffer, position).end()
+        if position == len(buffer):
+            buffer, position = file.read(CHUNK_SIZE), 0
+            if buffer:
+                continue
+            if state == 'end':
+                return
+            raise CommandError('Неверный JSON: файл оборвался.')
+        next_state = punctuation(state, buffer[position])
+        if next_state is not None:
+            state, position = next_state, position + 1
+            continue
+        item, buffer, position = read_item(decoder, file, buffer, position)
+        yield item
+        state = 'separator'
+
+
+def punctuation(state, char):
+    """состояние после скобки или запятой, None - дальше элемент"""
+    if state == 'end':
+        raise CommandError('Неверный JSON: данные после массива.')
+    if state == 'start':
+        if char != '[':
+            raise CommandError('Ожидался JSON-массив ингредиентов.')
+        return 'first'
+    if char == ']' and state in ('first', 'separator'):
+        return 'end'
+    if state == 'separator':
+        if char != ',':
+            raise CommandError(
+                f'Неверный JSON: ожидалась запятая, а не {char!r}.'
+            )
+        return 'item'
+    return None
+
+
+def read_item(decoder, file, buffer, position):
+    """
+    Разбирает элемент с позиции position, дочитывая файл, если элемент
+    оборвался на границе прочитанной части. Возвращает элемент, буфер
+    и позицию за элементом.
+    """
+    while True:
+        error = None
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except ValueError as exc:
+            error, end = exc, len(buffer)
+        if end == len(buffer) and len(buffer) - position <= MAX_ITEM_SIZE:
+            chunk = file.read(CHUNK_SIZE)
+            if chunk:
+                buffer, position = buffer[position:] + chunk, 0
+                continue
+        if error is not None:
+            raise CommandError(f'Неверный JSON: {error}')
+        return item, buffer, end
+
+
+def jsonl_rows(file):
+    """по объекту JSON в строке, файл читается построчно"""
+    for line in file:
+        if not line.strip():
+            continue
+        try:
+            yield item_row(json.loads(line))
+        except ValueError:
+            yield None
+
+
+def item_row(item):
+    if not isinstance(item, dict):
+        return None
+    return [item.get('name'), item.get('measurement_unit')]
+
 
 class Command(BaseCommand):
     """
-    Добавляем ингредиенты из файла CSV.
+    Добавляем ингредиенты из файла CSV, JSON или JSON Lines.
     После миграции БД запускаем командой
     python manage.py load_ingredients локально
     или
     sudo docker-compose exec backend python manage.py load_ingredients
     на удаленном сервере.
-    Создает записи в модели Ingredients из списка.
+    Файл по умолчанию - recipes/data/ingredients.csv, можно указать
+    другой или прочитать из stdin:
+    python manage.py load_ingredients data/ingredients.json
+    cat ingredients.jsonl | python manage.py load_ingredients - --format jsonl
+    Строки и элементы JSON-массива читаются потоком и вставляются
+    пачками через bulk_create, уже существующие ингредиенты
+    пропускаются, повторный запуск ничего не меняет.
     """
-    help = 'Load ingredients data from csv-file to DB.'
-
-    def handle(self, *args, **kwargs):
-        with open(
-                'recipes/data/ingredients.csv', 'r',
-                encoding='UTF-8'
-        ) as ingredients:
-            for row in reader(ingredients):
-                if len(row) == 2:
-                    Ingredient.objects.get_or_create(
-                        name=row[0], measurement_unit=row[1],
-                    )
+    help = 'Load ingredients data from csv, json or jsonl file to DB.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default=DEFAULT_PATH,
+            help='Путь к файлу или "-" для чтения из stdin.'
+        )
+        parser.add_argument(
+            '--format', choices=FORMATS, default=None,
+            help='Формат данных, по умолчанию - по расширению файла.'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        data_format = options['format'] or self.guess_format(path)
+        started = time.perf_counter()
+        if path == '-':
+            file = io.TextIOWrapper(sys.stdin.buffer, encoding='UTF-8')
+            stats = self.load(file, data_format, options['batch_size'])
+        else:
+            try:
+                file = open(path, 'r', encoding='UTF-8')
+            except OSError as error:
+                raise CommandError(f'Не удалось открыть {path}: {error}')
+            with file:
+                stats = self.load(file, data_format, options['batch_size'])
+        # bulk_create минует сигналы, сбрасывающие кеши каталога
+        ingredient_index.invalidate()
+        bump_versions(CATALOGUE)
+        inserted, skipped, invalid = stats
+        self.stdout.write(self.style.SUCCESS(
+            f'Добавлено: {inserted}, пропущено: {skipped}, '
+            f'с ошибкой: {invalid} за {time.perf_counter() - started:.2f} с'
+        ))
+
+    @staticmethod
+    def guess_format(path):
+        extension = path.rsplit('.', 1)[-1].lower()
+        return extension if extension in FORMATS else 'csv'
+
+    def load(self, file, data_format, batch_size):
+        rows = {
+            'csv': csv_rows, 'json': json_rows, 'jsonl': jsonl_rows,
+        }[data_format](file)
+        ingredients = self.valid_ingredients(rows)
+        with transaction.atomic():
+            before = Ingredient.objects.count()
+            total = 0
+            while True:
+                batch = list(islice(ingredients, batch_size))
+                if not batch:
+                    break
+                Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+                total += len(batch)
+            inserted = Ingredient.objects.count() - before
+        return inserted, total - inserted, self.invalid
+
+    def valid_ingredients(self, rows):
+        name_length = Ingredient._meta.get_field('name').max_length
+        unit_length = Ingredient._meta.get_field(
+            'measurement_unit').max_length
+        self.invalid = 0
+        for row in rows:
+            name, unit = row if row else (None, None)
+            if (
+                not isinstance(name, str) or not isinstance(unit, str)
+                or not name.strip() or len(name.strip()) > name_length
+                or len(unit.strip()) > unit_length
+            ):
+                self.invalid += 1
+                continue
+            yield Ingredient(
+                name=name.strip(), measurement_unit=unit.strip()
+            )
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from recipes.images import process_image, use_processed
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """
+    Обрабатываем изображения рецептов, до которых не дошел пул потоков:
+    python manage.py process_recipe_images
+    После изменения RECIPE_THUMBNAIL_SIZES миниатюры всех рецептов
+    перестраиваются так:
+    python manage.py process_recipe_images --all
+    """
+    help = 'Downscale recipe images and build their thumbnails.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Обработать и уже обработанные изображения.'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.exclude(processed_image=F('image'))
+        names = recipes.order_by().values_list(
+            'image', flat=True
+        ).distinct()
+        processed = failed = 0
+        for name in names.iterator():
+            try:
+                processed_name = process_image(name)
+            except Exception as error:
+                failed += 1
+                self.stderr.write(f'{name}: {error}')
+                continue
+            # одним файлом могут пользоваться несколько рецептов
+            use_processed(name, processed_name)
+            processed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано изображений: {processed}, с ошибкой: {failed} '
+            f'за {time.perf_counter() - started:.1f} с'
+        ))
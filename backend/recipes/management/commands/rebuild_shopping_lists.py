@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    """
+    Пересчитываем сводные списки покупок из корзин пользователей:
+    python manage.py rebuild_shopping_lists
+    или только для некоторых пользователей:
+    python manage.py rebuild_shopping_lists --user 1 --user 2
+    """
+    help = 'Rebuild per-user shopping list totals from shopping carts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='user_ids',
+            help='id пользователя, можно указать несколько раз.'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = ShoppingListItem.objects.rebuild(options['user_ids'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Позиций в списках покупок: {count}'
+        ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    """
+    Сверяем счетчики избранного, рецептов и подписчиков с настоящими
+    данными и исправляем расхождения:
+    python manage.py reconcile_counters
+    """
+    help = 'Recount favorites, recipes and followers counters.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            fixed = reconcile_counters()
+        for counter, count in fixed.items():
+            self.stdout.write(f'{counter}: исправлено {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено счетчиков: {sum(fixed.values())}'
+        ))
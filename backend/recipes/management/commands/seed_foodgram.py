@@ -0,0 +1,243 @@
+import random
+import time
+import uuid
+from csv import reader
+from itertools import accumulate, islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.counters import reconcile_counters
+from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                            ShoppingCart, ShoppingListItem, Tag, TagRecipe)
+from users.models import Follow, User
+
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+WORDS = (
+    'нарезать', 'обжарить', 'добавить', 'перемешать', 'посолить',
+    'довести', 'до', 'кипения', 'на', 'среднем', 'огне', 'минут',
+    'подавать', 'горячим', 'с', 'зеленью', 'тесто', 'соус', 'духовке',
+)
+SEED_PASSWORD = 'foodgram-seed'
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Command(BaseCommand):
+    """
+    Наполняем БД синтетическими данными для нагрузочного тестирования.
+    Пример:
+    python manage.py seed_foodgram --users 10000 --recipes 100000
+    Создает пользователей, рецепты с ингредиентами из ingredients.csv
+    и тегами, подписки, избранное и списки покупок пачками через
+    bulk_create. Пароль всех созданных пользователей - foodgram-seed.
+    """
+    help = 'Generate synthetic users, recipes, follows, favorites and carts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument(
+            '--authors-share', type=float, default=0.2,
+            help='Доля пользователей, публикующих рецепты.'
+        )
+        parser.add_argument('--follows-per-user', type=int, default=10)
+        parser.add_argument('--favorites-per-user', type=int, default=20)
+        parser.add_argument('--carts-per-user', type=int, default=5)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument(
+            '--prefix', default=None,
+            help='Префикс имен пользователей и рецептов, '
+                 'по умолчанию случайный.'
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.prefix = options['prefix'] or uuid.uuid4().hex[:6]
+        started = time.perf_counter()
+
+        ingredient_ids = self.stage('ingredients', self.ensure_ingredients)
+        tag_ids = self.stage('tags', self.ensure_tags)
+        user_ids = self.stage(
+            'users', self.create_users, options['users']
+        )
+        author_ids = user_ids[
+            :max(1, int(len(user_ids) * options['authors_share']))
+        ]
+        recipe_ids = self.stage(
+            'recipes', self.create_recipes, options['recipes'], author_ids
+        )
+        self.stage(
+            'search vectors', Recipe.objects.filter(
+                name__startswith=f'{self.prefix}-').update_search_vector
+        )
+        self.stage(
+            'recipe tags', self.create_tag_links, recipe_ids, tag_ids
+        )
+        self.stage(
+            'recipe ingredients', self.create_ingredient_links,
+            recipe_ids, ingredient_ids
+        )
+        self.stage(
+            'follows', self.create_follows, user_ids, author_ids,
+            options['follows_per_user']
+        )
+        self.stage(
+            'favorites', self.create_user_recipe_links, Favorite,
+            user_ids, recipe_ids, options['favorites_per_user']
+        )
+        self.stage(
+            'shopping carts', self.create_user_recipe_links, ShoppingCart,
+            user_ids, recipe_ids, options['carts_per_user']
+        )
+        self.stage(
+            'shopping lists', ShoppingListItem.objects.rebuild, user_ids
+        )
+        self.stage(
+            'counters', lambda: sum(reconcile_counters().values())
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.perf_counter() - started:.1f} с, '
+            f'префикс {self.prefix}.'
+        ))
+
+    def stage(self, name, func, *args):
+        started = time.perf_counter()
+        with transaction.atomic():
+            result = func(*args)
+        count = len(result) if isinstance(result, list) else result
+        self.stdout.write(
+            f'{name}: {count} за {time.perf_counter() - started:.1f} с'
+        )
+        return result
+
+    def bulk_create(self, model, objs):
+        created = 0
+        for batch in batches(objs, self.batch_size):
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+            created += len(batch)
+        return created
+
+    def ensure_ingredients(self):
+        with open(
+                'recipes/data/ingredients.csv', 'r', encoding='UTF-8'
+        ) as ingredients:
+            self.bulk_create(Ingredient, (
+                Ingredient(name=row[0], measurement_unit=row[1])
+                for row in reader(ingredients) if len(row) == 2
+            ))
+        return list(Ingredient.objects.values_list('id', flat=True))
+
+    def ensure_tags(self):
+        self.bulk_create(Tag, (
+            Tag(name=name, color=color, slug=slug)
+            for name, color, slug in TAGS
+        ))
+        return list(Tag.objects.values_list('id', flat=True))
+
+    def create_users(self, count):
+        password = make_password(SEED_PASSWORD)
+        self.bulk_create(User, (
+            User(
+                username=f'{self.prefix}-user{i}',
+                email=f'{self.prefix}-user{i}@foodgram.ru',
+                first_name=f'Имя{i}',
+                last_name=f'Фамилия{i}',
+                password=password,
+            )
+            for i in range(count)
+        ))
+        return list(User.objects.filter(
+            username__startswith=f'{self.prefix}-user'
+        ).order_by('id').values_list('id', flat=True))
+
+    @staticmethod
+    def zipf_weights(count):
+        """
+        Накопленные веса: популярность падает с номером,
+        немногие авторы и рецепты собирают большую часть активности.
+        """
+        return list(accumulate(1 / (rank + 1) for rank in range(count)))
+
+    def create_recipes(self, count, author_ids):
+        authors = self.random.choices(
+            author_ids, cum_weights=self.zipf_weights(len(author_ids)),
+            k=count
+        )
+        self.bulk_create(Recipe, (
+            Recipe(
+                author_id=author_id,
+                name=f'{self.prefix}-Рецепт {i}',
+                text=' '.join(self.random.choices(
+                    WORDS, k=self.random.randint(20, 200))),
+                image='recipes/image_1.png',
+                cooking_time=self.random.randint(5, 180),
+            )
+            for i, author_id in enumerate(authors)
+        ))
+        return list(Recipe.objects.filter(
+            name__startswith=f'{self.prefix}-'
+        ).order_by('id').values_list('id', flat=True))
+
+    def create_tag_links(self, recipe_ids, tag_ids):
+        return self.bulk_create(TagRecipe, (
+            TagRecipe(tag_id=tag_id, recipe_id=recipe_id)
+            for recipe_id in recipe_ids
+            for tag_id in self.random.sample(
+                tag_ids, self.random.randint(1, min(3, len(tag_ids))))
+        ))
+
+    def create_ingredient_links(self, recipe_ids, ingredient_ids):
+        return self.bulk_create(IngredientRecipe, (
+            IngredientRecipe(
+                recipe_id=recipe_id,
+                ingredient_id=ingredient_id,
+                amount=self.random.randint(1, 500),
+            )
+            for recipe_id in recipe_ids
+            for ingredient_id in self.random.sample(
+                ingredient_ids,
+                min(len(ingredient_ids), max(
+                    2, int(self.random.gauss(8, 3)))))
+        ))
+
+    def pick(self, population, weights, count):
+        """до count разных элементов, с учетом популярности"""
+        if count >= len(population):
+            return set(population)
+        return set(self.random.choices(
+            population, cum_weights=weights, k=count))
+
+    def create_follows(self, user_ids, author_ids, per_user):
+        weights = self.zipf_weights(len(author_ids))
+        return self.bulk_create(Follow, (
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id in user_ids
+            for author_id in self.pick(
+                author_ids, weights, self.random.randint(0, 2 * per_user))
+            if author_id != user_id
+        ))
+
+    def create_user_recipe_links(self, model, user_ids, recipe_ids,
+                                 per_user):
+        weights = self.zipf_weights(len(recipe_ids))
+        return self.bulk_create(model, (
+            model(user_id=user_id, recipe_id=recipe_id)
+            for user_id in user_ids
+            for recipe_id in self.pick(
+                recipe_ids, weights, self.random.randint(0, 2 * per_user))
+        ))
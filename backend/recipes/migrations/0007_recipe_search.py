@@ -0,0 +1,49 @@
+# Generated by Django 3.2.16 on 2026-10-18 06:16
+
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.operations import TrigramExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX recipe_search_vector_gin '
+        'ON recipes_recipe USING gin (search_vector)'
+    )
+    schema_editor.execute(
+        'CREATE INDEX recipe_name_trgm_gin '
+        'ON recipes_recipe USING gin (name gin_trgm_ops)'
+    )
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Recipe.objects.update(search_vector=(
+        SearchVector('name', weight='A', config=settings.SEARCH_CONFIG)
+        + SearchVector('text', weight='B', config=settings.SEARCH_CONFIG)
+    ))
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS recipe_search_vector_gin')
+    schema_editor.execute('DROP INDEX IF EXISTS recipe_name_trgm_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_shoppinglistitem'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-18 08:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='processed_image',
+            field=models.CharField(blank=True, editable=False, help_text='Изображение, для которого построены миниатюры', max_length=100, verbose_name='Обработанное изображение'),
+        ),
+    ]
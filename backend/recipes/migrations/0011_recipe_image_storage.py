@@ -0,0 +1,19 @@
+# Generated by Django 3.2.16 on 2026-10-18 09:05
+
+from django.db import migrations, models
+import recipes.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_recipe_processed_image'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(db_index=True, help_text='Загрузите изображение с фотографией готового блюда', storage=recipes.storage.ContentAddressedStorage(), upload_to='recipes/', verbose_name='Фото готового блюда'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-18 07:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_dataversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='original_image',
+            field=models.CharField(blank=True, editable=False, help_text='Загруженный файл, из которого получено изображение', max_length=100, verbose_name='Исходное изображение'),
+        ),
+    ]
@@ -1,8 +1,16 @@
 from colorfield.fields import ColorField
+from django.conf import settings
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector, SearchVectorField,
+                                            TrigramSimilarity)
 from django.core import validators
-from django.db import models
+from django.db import connections, models
+from django.db.models import (Case, Exists, F, Func, OuterRef, Prefetch, Q,
+                              Sum, Value, When, Window)
+from django.db.models.functions import RowNumber
 
-from users.models import User
+from users.models import CounterFieldsMixin, Follow, User
+from .storage import recipe_image_storage
 
 
 class Tag(models.Model):
@@ -16,6 +24,10 @@ class Tag(models.Model):
         unique=True,
         verbose_name='Поле Slug'
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
 
     class Meta:
         ordering = ('-id',)
@@ -36,6 +48,10 @@ class Ingredient(models.Model):
         max_length=40,
         verbose_name='Единица измерения'
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
 
     class Meta:
         ordering = ('-id',)
@@ -46,7 +62,119 @@ class Ingredient(models.Model):
         return self.name
 
 
-class Recipe(models.Model):
+class Casefold(Func):
+    """
+    str.casefold на SQLite, функцию подключает
+    recipes.signals.add_casefold_function.
+    """
+    function = 'CASEFOLD'
+    output_field = models.TextField()
+
+
+class RecipeQuerySet(models.QuerySet):
+    def with_related(self):
+        """подгружает автора, теги и ингредиенты без запросов на каждый рецепт"""
+        return self.select_related('author').defer(
+            'search_vector'
+        ).prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredient_recipe',
+                queryset=IngredientRecipe.objects.select_related('ingredient')
+            ),
+        )
+
+    def limit_per_author(self, limit, fields):
+        """
+        Не больше limit последних рецептов каждого автора одним запросом:
+        ROW_NUMBER() OVER (PARTITION BY author_id) во вложенном запросе.
+        """
+        ranked = self.annotate(row_number=Window(
+            RowNumber(),
+            partition_by=[F('author_id')],
+            order_by=F('id').desc(),
+        )).order_by().values(*fields, 'row_number')
+        sql, params = ranked.query.sql_with_params()
+        return self.model.objects.raw(
+            f'SELECT * FROM ({sql}) AS ranked WHERE row_number <= %s '
+            f'ORDER BY author_id, row_number',
+            (*params, limit),
+        )
+
+    def with_user_flags(self, user):
+        """аннотирует избранное, корзину и подписку на автора для user"""
+        if user.is_anonymous:
+            return self.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False),
+                author_is_subscribed=Value(False),
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            author_is_subscribed=Exists(Follow.objects.filter(
+                user=user, author=OuterRef('author'))),
+        )
+
+    def with_tags(self, tag_ids, match_all=False):
+        """
+        Рецепты с любым из тегов tag_ids, при match_all - со всеми.
+        EXISTS вместо JOIN: каждый рецепт один раз без DISTINCT, и COUNT(*)
+        пагинатора не считает строки связей. Подзапрос ищет по индексу
+        уникальности TagRecipe (tag, recipe).
+        """
+        if not tag_ids:
+            return self.none()
+        if not match_all:
+            return self.filter(Exists(TagRecipe.objects.filter(
+                tag_id__in=tag_ids, recipe=OuterRef('pk'))))
+        queryset = self
+        for tag_id in set(tag_ids):
+            queryset = queryset.filter(Exists(TagRecipe.objects.filter(
+                tag_id=tag_id, recipe=OuterRef('pk'))))
+        return queryset
+
+    def update_search_vector(self):
+        """пересчитывает поисковый вектор, только для PostgreSQL"""
+        if connections[self.db].vendor != 'postgresql':
+            return 0
+        return self.update(search_vector=(
+            SearchVector('name', weight='A', config=settings.SEARCH_CONFIG)
+            + SearchVector('text', weight='B', config=settings.SEARCH_CONFIG)
+        ))
+
+    def search(self, value):
+        """
+        Полнотекстовый поиск по названию и описанию с поиском по
+        триграммам названия для опечаток, по убыванию релевантности.
+        На SQLite - поиск всех слов запроса через LIKE.
+        """
+        if connections[self.db].vendor == 'postgresql':
+            query = SearchQuery(value, config=settings.SEARCH_CONFIG,
+                                search_type='websearch')
+            return self.annotate(
+                rank=SearchRank(F('search_vector'), query),
+                similarity=TrigramSimilarity('name', value),
+            ).filter(
+                Q(search_vector=query) | Q(name__trigram_similar=value)
+            ).order_by('-rank', '-similarity', '-id')
+        # LIKE и LOWER в SQLite не различают регистр только для ASCII
+        queryset = self.annotate(
+            search_name=Casefold('name'), search_text=Casefold('text')
+        )
+        for word in value.casefold().split():
+            queryset = queryset.filter(
+                Q(search_name__contains=word) | Q(search_text__contains=word)
+            )
+        return queryset.annotate(rank=Case(
+            When(search_name__contains=value.casefold(), then=Value(1)),
+            default=Value(0),
+        )).order_by('-rank', '-id')
+
+
+class Recipe(CounterFieldsMixin, models.Model):
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -74,8 +202,24 @@ class Recipe(models.Model):
     image = models.ImageField(
         verbose_name='Фото готового блюда',
         upload_to='recipes/',
+        storage=recipe_image_storage,
+        db_index=True,
         help_text='Загрузите изображение с фотографией готового блюда',
     )
+    processed_image = models.CharField(
+        max_length=100,
+        blank=True,
+        editable=False,
+        verbose_name='Обработанное изображение',
+        help_text='Изображение, для которого построены миниатюры',
+    )
+    original_image = models.CharField(
+        max_length=100,
+        blank=True,
+        editable=False,
+        verbose_name='Исходное изображение',
+        help_text='Загруженный файл, из которого получено изображение',
+    )
     cooking_time = models.PositiveSmallIntegerField(
         validators=(
             validators.MinValueValidator(
@@ -83,6 +227,23 @@ class Recipe(models.Model):
         ),
         verbose_name='Время приготовления'
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор'
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Добавлений в избранное'
+    )
+
+    objects = RecipeQuerySet.as_manager()
+    counter_fields = ('favorites_count',)
 
     class Meta:
         ordering = ('-id',)
@@ -205,3 +366,163 @@ class ShoppingCart(models.Model):
     def __str__(self):
         return (f'У пользователя {self.user.username}'
                 f' в списке покупок {self.recipe.name}')
+
+
+class ShoppingListManager(models.Manager):
+    def change(self, user_ids, amounts):
+        """
+        Прибавляет amounts ({id ингредиента: изменение}) к списку покупок
+        пользователей user_ids и удаляет позиции, которые стали пустыми.
+        """
+        user_ids = list(user_ids)
+        amounts = {key: value for key, value in amounts.items() if value}
+        if not user_ids or not amounts:
+            return
+        self.bulk_create(
+            [
+                self.model(user_id=user_id, ingredient_id=ingredient_id,
+                           amount=0)
+                for user_id in user_ids for ingredient_id in amounts
+            ],
+            ignore_conflicts=True,
+        )
+        items = self.filter(user_id__in=user_ids)
+        # одно обновление на все ингредиенты, сколько бы разных изменений
+        delta = Case(
+            *(
+                When(ingredient_id=ingredient_id, then=Value(value))
+                for ingredient_id, value in amounts.items()
+            ),
+            default=Value(0),
+            output_field=models.IntegerField(),
+        )
+        items.filter(ingredient_id__in=amounts).update(
+            amount=F('amount') + delta
+        )
+        items.filter(amount__lte=0).delete()
+
+    def recipe_amounts(self, recipe_id, sign=1):
+        return {
+            ingredient_id: sign * amount
+            for ingredient_id, amount in IngredientRecipe.objects.filter(
+                recipe_id=recipe_id
+            ).values_list('ingredient_id', 'amount')
+        }
+
+    def add_recipe(self, user_id, recipe_id):
+        self.change([user_id], self.recipe_amounts(recipe_id))
+
+    def remove_recipe(self, user_id, recipe_id):
+        self.change([user_id], self.recipe_amounts(recipe_id, sign=-1))
+
+    def rebuild(self, user_ids=None):
+        """пересчитывает списки покупок из ShoppingCart и IngredientRecipe"""
+        items = self.all()
+        carts = ShoppingCart.objects.all()
+        if user_ids is not None:
+            items = items.filter(user_id__in=user_ids)
+            carts = carts.filter(user_id__in=user_ids)
+        items.delete()
+        totals = carts.values(
+            'user_id', 'recipe__ingredient_recipe__ingredient_id'
+        ).annotate(
+            total=Sum('recipe__ingredient_recipe__amount')
+        ).order_by()
+        return len(self.bulk_create(
+            (
+                self.model(
+                    user_id=row['user_id'],
+                    ingredient_id=row[
+                        'recipe__ingredient_recipe__ingredient_id'],
+                    amount=row['total'],
+                )
+                for row in totals.iterator()
+                if row['recipe__ingredient_recipe__ingredient_id']
+            ),
+            batch_size=5000,
+        ))
+
+
+class ShoppingListItem(models.Model):
+    """
+    Сводный список покупок пользователя: сумма количества ингредиента
+    по всем рецептам в корзине. Поддерживается при изменении корзины
+    и ингредиентов рецептов, восстанавливается командой
+    rebuild_shopping_lists.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Ингредиент'
+    )
+    amount = models.IntegerField(
+        default=0,
+        verbose_name='Количество'
+    )
+
+    objects = ShoppingListManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'ingredient'],
+                                    name='unique_shopping_list_item')
+        ]
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Сводные списки покупок'
+
+    def __str__(self):
+        return (f'У пользователя {self.user.username}'
+                f' в списке покупок {self.ingredient.name}')
+
+
+class DataVersionManager(models.Manager):
+    def get_many(self, names):
+        """версии names одним запросом, у еще не изменявшихся данных - 0"""
+        versions = dict(
+            self.filter(name__in=names).values_list('name', 'version')
+        )
+        return [versions.get(name, 0) for name in names]
+
+    def bump(self, *names):
+        names = sorted(set(names))
+        rows = self.filter(name__in=names)
+        if rows.update(version=F('version') + 1) < len(names):
+            # первое изменение: строку мог создать и параллельный запрос
+            self.bulk_create(
+                [self.model(name=name) for name in names],
+                ignore_conflicts=True,
+            )
+            rows.update(version=F('version') + 1)
+
+
+class DataVersion(models.Model):
+    """
+    Номера версий данных для ключей кеша ответов и ETag. Хранятся в БД,
+    поэтому изменение из любого процесса сразу видно всем остальным,
+    а чтение - один запрос по первичному ключу.
+    """
+    name = models.CharField(
+        max_length=64,
+        primary_key=True,
+        verbose_name='Данные'
+    )
+    version = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name='Версия'
+    )
+
+    objects = DataVersionManager()
+
+    class Meta:
+        verbose_name = 'Версия данных'
+        verbose_name_plural = 'Версии данных'
+
+    def __str__(self):
+        return f'{self.name}: {self.version}'
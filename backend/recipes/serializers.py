@@ -1,9 +1,14 @@
+from django.db import transaction
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
 from users.serializers import CustomUserSerializer
+from .cache import RECIPES, bump_versions, recipe_version
+from .fields import RecipeImageField, ThumbnailsField
+from .images import is_current_image
 from .models import (Favorite, Ingredient, IngredientRecipe, Recipe,
-                     ShoppingCart, Tag)
+                     ShoppingCart, ShoppingListItem, Tag)
+from .tag_catalogue import tag_catalogue
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -37,18 +42,27 @@ class RecipeSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField(read_only=True)
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
     image = Base64ImageField()
+    thumbnails = ThumbnailsField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'ingredients', 'author',
-                  'name', 'image', 'text', 'cooking_time',
+                  'name', 'image', 'thumbnails', 'text', 'cooking_time',
                   'is_favorited', 'is_in_shopping_cart')
 
+    def to_representation(self, recipe):
+        # аннотация из RecipeQuerySet.with_user_flags
+        if hasattr(recipe, 'author_is_subscribed'):
+            recipe.author.is_subscribed = recipe.author_is_subscribed
+        return super().to_representation(recipe)
+
     def get_ingredients(self, recipe):
         ingredient_recipe = recipe.ingredient_recipe.all()
         return IngredientQuantitySerializer(ingredient_recipe, many=True).data
 
     def get_is_favorited(self, recipe):
+        if hasattr(recipe, 'is_favorited'):
+            return recipe.is_favorited
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
@@ -56,6 +70,8 @@ class RecipeSerializer(serializers.ModelSerializer):
                                        recipe=recipe).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
@@ -64,9 +80,8 @@ class RecipeSerializer(serializers.ModelSerializer):
 
 
 class IngredientWriteSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all()
-    )
+    # существование проверяет RecipeWriteSerializer одним запросом
+    id = serializers.IntegerField()
     amount = serializers.IntegerField()
 
     class Meta:
@@ -74,12 +89,26 @@ class IngredientWriteSerializer(serializers.ModelSerializer):
         fields = ('id', 'amount')
 
 
+class CatalogueTagField(serializers.PrimaryKeyRelatedField):
+    """id тега проверяется по каталогу в памяти, а не запросом к БД"""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('queryset', Tag.objects.all())
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool) or not isinstance(data, (int, str)):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        tag = tag_catalogue.get(data)
+        if tag is None:
+            self.fail('does_not_exist', pk_value=data)
+        return tag
+
+
 class RecipeWriteSerializer(serializers.ModelSerializer):
-    image = Base64ImageField()
+    image = RecipeImageField()
     ingredients = IngredientWriteSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(), many=True
-    )
+    tags = CatalogueTagField(many=True)
     author = CustomUserSerializer(read_only=True)
 
     class Meta:
@@ -126,51 +155,130 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             )
         return data
 
-    def create_ingredients(self, ingredients, recipe):
+    def validate_ingredients(self, ingredients):
+        """все id ингредиентов проверяются одним запросом"""
+        found = Ingredient.objects.in_bulk(
+            {ingredient['id'] for ingredient in ingredients}
+        )
+        missing = [
+            ingredient['id'] for ingredient in ingredients
+            if ingredient['id'] not in found
+        ]
+        if missing:
+            raise serializers.ValidationError(
+                f'Ингредиенты не найдены: {missing}'
+            )
         for ingredient in ingredients:
-            ingredient_id = ingredient['id']
-            amount = ingredient['amount']
-            objs = [
-                IngredientRecipe(
-                    recipe=recipe,
-                    ingredient=ingredient_id,
-                    amount=amount
-                )
-            ]
-            IngredientRecipe.objects.bulk_create(objs)
+            ingredient['id'] = found[ingredient['id']]
+        return ingredients
+
+    def save_ingredients(self, ingredients, recipe, existing=()):
+        """
+        Сравнивает новые ингредиенты с сохраненными строками и применяет
+        разницу: одна вставка, одно обновление и одно удаление.
+        """
+        existing = {row.ingredient_id: row for row in existing}
+        rows, created, changed = [], [], []
+        for ingredient in ingredients:
+            row = existing.pop(ingredient['id'].id, None)
+            if row is None:
+                row = IngredientRecipe(recipe=recipe,
+                                       ingredient=ingredient['id'],
+                                       amount=ingredient['amount'])
+                created.append(row)
+            elif row.amount != ingredient['amount']:
+                row.amount = ingredient['amount']
+                changed.append(row)
+            row.ingredient = ingredient['id']
+            rows.append(row)
+        if existing:
+            IngredientRecipe.objects.filter(
+                id__in=[row.id for row in existing.values()]
+            ).delete()
+        if changed:
+            IngredientRecipe.objects.bulk_update(changed, ['amount'])
+        if created:
+            IngredientRecipe.objects.bulk_create(created)
+        return rows
+
+    def update_shopping_lists(self, recipe, old_amounts, ingredients):
+        """переносит изменение ингредиентов в списки покупок"""
+        amounts = {
+            ingredient_id: -amount
+            for ingredient_id, amount in old_amounts.items()
+        }
+        for ingredient in ingredients:
+            ingredient_id = ingredient['id'].id
+            amounts[ingredient_id] = (
+                amounts.get(ingredient_id, 0) + ingredient['amount']
+            )
+        ShoppingListItem.objects.change(
+            ShoppingCart.objects.filter(recipe=recipe).values_list(
+                'user_id', flat=True),
+            amounts,
+        )
 
-    def create_tags(self, tags, recipe):
+    def save_tags(self, tags, recipe):
+        # set сам вычисляет разницу с текущими тегами
         recipe.tags.set(tags)
+        return sorted(tags, key=lambda tag: -tag.id)
 
+    def bump_recipe(self, recipe):
+        # строки ингредиентов меняются пачками, минуя сигналы
+        bump_versions(RECIPES, recipe_version(recipe.pk))
+
+    @transaction.atomic
     def create(self, validated_data):
         author = self.context.get('request').user  # type: ignore
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
         recipe = Recipe.objects.create(author=author, **validated_data)
-        self.create_tags(tags, recipe)
-        self.create_ingredients(ingredients, recipe)
+        self.written = (
+            self.save_tags(tags, recipe),
+            self.save_ingredients(ingredients, recipe),
+        )
+        # новый рецепт никто еще не добавил, на себя подписаться нельзя
+        recipe.is_favorited = False
+        recipe.is_in_shopping_cart = False
+        recipe.author_is_subscribed = False
+        self.bump_recipe(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        instance.image = validated_data.get('image', instance.image)
+        image = validated_data.get('image')
+        # фронтенд присылает изображение при каждом редактировании: тот же
+        # файл не должен сбрасывать обработанное изображение и миниатюры
+        if image is not None and not is_current_image(instance, image):
+            instance.image = image
         instance.name = validated_data.get('name', instance.name)
         instance.text = validated_data.get('text', instance.text)
         instance.cooking_time = validated_data.get(
             'cooking_time', instance.cooking_time
         )
 
-        instance.tags.clear()
-        tags = validated_data.get('tags')
-        self.create_tags(tags, instance)
-
-        IngredientRecipe.objects.filter(recipe=instance).all().delete()
+        # строки уже загружены prefetch в RecipeQuerySet.with_related
+        existing = list(instance.ingredient_recipe.all())
+        old_amounts = {row.ingredient_id: row.amount for row in existing}
         ingredients = validated_data.get('ingredients')
-        self.create_ingredients(ingredients, instance)
+        self.written = (
+            self.save_tags(validated_data.get('tags'), instance),
+            self.save_ingredients(ingredients, instance, existing),
+        )
+        self.update_shopping_lists(instance, old_amounts, ingredients)
 
         instance.save()
+        self.bump_recipe(instance)
         return instance
 
     def to_representation(self, instance):
+        if hasattr(self, 'written'):
+            # ответ собирается из уже известных тегов и ингредиентов,
+            # без повторной выборки рецепта
+            tags, rows = self.written
+            instance._prefetched_objects_cache = {
+                'tags': tags, 'ingredient_recipe': rows,
+            }
         request = self.context.get('request')
         context = {'request': request}
         return RecipeSerializer(
@@ -178,9 +286,11 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
 
 
 class RecipeRepresentationSerializer(serializers.ModelSerializer):
+    thumbnails = ThumbnailsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'thumbnails', 'cooking_time')
 
 
 class FavoriteRecipeSerializer(serializers.ModelSerializer):
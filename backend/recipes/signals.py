@@ -0,0 +1,154 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from users.models import Follow, User
+from .cache import (CATALOGUE, RECIPES, bump_versions, recipe_version,
+                    user_version)
+from .counters import change_counter
+from .images import image_pipeline, is_processed
+from .ingredient_index import ingredient_index
+from .models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                     ShoppingCart, ShoppingListItem, Tag, TagRecipe)
+from .tag_catalogue import tag_catalogue
+
+
+def casefold(value):
+    return None if value is None else value.casefold()
+
+
+@receiver(connection_created)
+def add_casefold_function(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        connection.connection.create_function('CASEFOLD', 1, casefold)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(sender, instance, created, **kwargs):
+    if created:
+        ShoppingListItem.objects.add_recipe(
+            instance.user_id, instance.recipe_id
+        )
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_from_shopping_list(sender, instance, **kwargs):
+    # pre_delete: при каскадном удалении рецепта его ингредиенты еще на месте
+    ShoppingListItem.objects.remove_recipe(
+        instance.user_id, instance.recipe_id
+    )
+
+
+@receiver(post_save, sender=Favorite)
+def increment_favorites_count(sender, instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, instance.recipe_id, 'favorites_count', 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def decrement_favorites_count(sender, instance, **kwargs):
+    change_counter(Recipe, instance.recipe_id, 'favorites_count', -1)
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(sender, instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(sender, instance, **kwargs):
+    change_counter(User, instance.author_id, 'recipes_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+def increment_followers_count(sender, instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.author_id, 'followers_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def decrement_followers_count(sender, instance, **kwargs):
+    change_counter(User, instance.author_id, 'followers_count', -1)
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def invalidate_tag_catalogue(sender, **kwargs):
+    tag_catalogue.invalidate()
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search_vector(sender, instance, update_fields, **kwargs):
+    if update_fields and not {'name', 'text'} & set(update_fields):
+        return
+    Recipe.objects.filter(pk=instance.pk).update_search_vector()
+
+
+@receiver(post_save, sender=Recipe)
+def schedule_image_processing(sender, instance, **kwargs):
+    if instance.image and not is_processed(instance):
+        image_pipeline.schedule(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+def bump_recipe_version(sender, instance, **kwargs):
+    bump_versions(RECIPES, recipe_version(instance.pk))
+
+
+@receiver([post_save, post_delete], sender=IngredientRecipe)
+@receiver([post_save, post_delete], sender=TagRecipe)
+def bump_recipe_content_version(sender, instance, **kwargs):
+    bump_versions(RECIPES, recipe_version(instance.recipe_id))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def bump_recipe_tags_version(sender, instance, action, **kwargs):
+    if action.startswith('post_') and isinstance(instance, Recipe):
+        bump_versions(RECIPES, recipe_version(instance.pk))
+
+
+@receiver([post_save, post_delete], sender=Tag)
+@receiver([post_save, post_delete], sender=Ingredient)
+def bump_catalogue_version(sender, **kwargs):
+    bump_versions(CATALOGUE)
+
+
+# Last-Modified рецепта - его updated_at: изменение тегов, ингредиентов
+# и автора, которые входят в ответ, обновляет и его
+
+
+@receiver([post_save, pre_delete], sender=Tag)
+def touch_tag_recipes(sender, instance, **kwargs):
+    # pre_delete: связи с рецептами еще на месте
+    Recipe.objects.filter(tags=instance).update(updated_at=timezone.now())
+
+
+@receiver([post_save, pre_delete], sender=Ingredient)
+def touch_ingredient_recipes(sender, instance, **kwargs):
+    Recipe.objects.filter(ingredients=instance).update(
+        updated_at=timezone.now()
+    )
+
+
+@receiver(post_save, sender=User)
+def bump_author_version(sender, instance, update_fields, **kwargs):
+    # вход пользователя обновляет только last_login
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    bump_versions(CATALOGUE)
+    # автор входит в ответ рецепта: его изменение - изменение рецепта
+    Recipe.objects.filter(author=instance).update(updated_at=timezone.now())
+
+
+@receiver([post_save, post_delete], sender=Favorite)
+@receiver([post_save, post_delete], sender=ShoppingCart)
+@receiver([post_save, post_delete], sender=Follow)
+def bump_user_version(sender, instance, **kwargs):
+    bump_versions(user_version(instance.user_id))
@@ -0,0 +1,44 @@
+import hashlib
+import os
+import posixpath
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Имя файла - sha256 его содержимого: recipes/ab/ab12...ef.png.
+    Повторная загрузка того же изображения (фронтенд присылает его
+    при каждом редактировании рецепта) ничего не пишет на диск.
+    Файлы, на которые не ссылается ни один рецепт, удаляет команда
+    collect_recipe_images.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        name = self.content_name(name, content)
+        if self.exists(name):
+            # свежая ссылка: сборщик не тронет файл, пока идет транзакция
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length)
+
+    @staticmethod
+    def content_name(name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        directory, filename = posixpath.split(name)
+        extension = posixpath.splitext(filename)[1].lower()
+        hexdigest = digest.hexdigest()
+        return posixpath.join(
+            directory, hexdigest[:2], f'{hexdigest}{extension}'
+        )
+
+
+recipe_image_storage = ContentAddressedStorage()
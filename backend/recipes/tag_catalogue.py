@@ -0,0 +1,70 @@
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+
+from .models import Tag
+
+CatalogueState = namedtuple(
+    'CatalogueState', 'tags by_id expires_at updated_at'
+)
+
+
+class TagCatalogue:
+    """
+    Все теги в памяти процесса: таблица маленькая и меняется редко.
+    Загружается лениво, сбрасывается сигналами при сохранении и удалении
+    тега и, для остальных процессов, раз в TAG_CATALOGUE_TTL секунд.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = None
+
+    def invalidate(self):
+        self._state = None
+
+    def _get(self):
+        state = self._state
+        if state is not None and time.monotonic() < state.expires_at:
+            return state
+        with self._lock:
+            state = self._state
+            if state is None or time.monotonic() >= state.expires_at:
+                state = self._build()
+                self._state = state
+        return state
+
+    @staticmethod
+    def _build():
+        tags = list(Tag.objects.all())
+        return CatalogueState(
+            tags=tags,
+            by_id={tag.id: tag for tag in tags},
+            expires_at=time.monotonic() + settings.TAG_CATALOGUE_TTL,
+            updated_at=max((tag.updated_at for tag in tags), default=None),
+        )
+
+    def all(self):
+        """теги в порядке Tag.Meta.ordering"""
+        return self._get().tags
+
+    def get(self, pk):
+        """тег по id (число или строка из URL), None если такого нет"""
+        try:
+            pk = int(pk)
+        except (TypeError, ValueError):
+            return None
+        return self._get().by_id.get(pk)
+
+    def slug_choices(self):
+        return [(tag.slug, tag.slug) for tag in self.all()]
+
+    def state(self):
+        """число тегов и время последнего изменения"""
+        state = self._get()
+        return len(state.tags), state.updated_at
+
+
+tag_catalogue = TagCatalogue()
@@ -0,0 +1,74 @@
+import json
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.utils.datastructures import MultiValueDict
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError
+from rest_framework.parsers import DataAndFiles, MultiPartParser
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Файл изображения слишком большой.'
+    default_code = 'upload_too_large'
+
+
+class RecipeImageUploadHandler(TemporaryFileUploadHandler):
+    """
+    Пишет загружаемое изображение сразу во временный файл по частям
+    и прерывает загрузку, как только она превысила
+    RECIPE_IMAGE_MAX_UPLOAD_SIZE.
+    """
+
+    def handle_raw_input(self, input_data, meta, content_length, boundary,
+                         encoding=None):
+        self.received = 0
+        if content_length and content_length > self.max_request_size():
+            raise UploadTooLarge()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.RECIPE_IMAGE_MAX_UPLOAD_SIZE:
+            raise UploadTooLarge()
+        return super().receive_data_chunk(raw_data, start)
+
+    @staticmethod
+    def max_request_size():
+        # кроме файла в запросе поля рецепта и разделители частей
+        return (settings.RECIPE_IMAGE_MAX_UPLOAD_SIZE
+                + settings.DATA_UPLOAD_MAX_MEMORY_SIZE)
+
+
+class FormData(dict):
+    """
+    Поля из части data. Request добавляет к ним файлы через copy()
+    и update(): у обычного dict из MultiValueDict попали бы списки.
+    """
+
+    def copy(self):
+        return FormData(self)
+
+    def update(self, other=(), **kwargs):
+        if isinstance(other, MultiValueDict):
+            other = other.dict()
+        super().update(other, **kwargs)
+
+
+class RecipeMultiPartParser(MultiPartParser):
+    """
+    multipart/form-data для рецепта: файл в части image, остальные
+    поля - JSON в части data, как в теле обычного запроса.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        result = super().parse(stream, media_type, parser_context)
+        if 'data' not in result.data:
+            return result
+        try:
+            data = json.loads(result.data['data'])
+        except ValueError as error:
+            raise ParseError(f'Поле data должно содержать JSON: {error}')
+        if not isinstance(data, dict):
+            raise ParseError('Поле data должно содержать JSON-объект.')
+        return DataAndFiles(FormData(data), result.files)
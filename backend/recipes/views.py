@@ -1,45 +1,141 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404
 from django.shortcuts import get_object_or_404
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
 from backend.pagination import LimitPageNumberPaginator
-from .filters import IngredientSearchFilter, RecipeFilter
-from .models import (Favorite, Ingredient, IngredientRecipe, Recipe,
-                     ShoppingCart, Tag)
+from .cache import overlay_user_fields, recipe_detail_key, recipe_list_key
+from .conditional import (ingredient_list_etag, ingredient_list_last_modified,
+                          object_etag, object_last_modified,
+                          recipe_detail_etag, recipe_detail_last_modified,
+                          recipe_list_etag, tag_etag, tag_last_modified,
+                          tag_list_etag, tag_list_last_modified)
+from .fast_serializers import (FastIngredientSerializer, FastRecipeSerializer,
+                               fast_serializers_enabled)
+from .filters import RecipeFilter
+from .ingredient_index import ingredient_index
+from .models import (Favorite, Ingredient, Recipe, ShoppingCart,
+                     ShoppingListItem)
 from .permissions import IsOwnerOrReadOnly
 from .serializers import (FavoriteRecipeSerializer, IngredientSerializer,
                           RecipeSerializer, RecipeWriteSerializer,
                           ShoppingCartSerializer, TagSerializer)
+from .tag_catalogue import tag_catalogue
+from .uploads import RecipeImageUploadHandler, RecipeMultiPartParser
 from .utils import shopping_list_txt
 
 
+@method_decorator(condition(
+    etag_func=tag_list_etag, last_modified_func=tag_list_last_modified
+), name='list')
+@method_decorator(condition(
+    etag_func=tag_etag, last_modified_func=tag_last_modified
+), name='retrieve')
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (AllowAny,)
+    filter_backends = ()
+    # чтение с реплики, см. backend.middleware.ReplicaMiddleware
+    replica_actions = ('list', 'retrieve')
 
+    def get_queryset(self):
+        """теги берутся из каталога в памяти, без запросов к БД"""
+        return tag_catalogue.all()
 
+    def get_object(self):
+        tag = tag_catalogue.get(self.kwargs['pk'])
+        if tag is None:
+            raise Http404
+        self.check_object_permissions(self.request, tag)
+        return tag
+
+
+@method_decorator(condition(
+    etag_func=ingredient_list_etag,
+    last_modified_func=ingredient_list_last_modified,
+), name='list')
+@method_decorator(condition(
+    etag_func=object_etag(Ingredient),
+    last_modified_func=object_last_modified(Ingredient),
+), name='retrieve')
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (AllowAny,)
-    filter_backends = (IngredientSearchFilter,)
-    search_fields = ('^name',)
+    replica_actions = ('list', 'retrieve')
+
+    def list(self, request, *args, **kwargs):
+        """поиск по ?name= обслуживается индексом в памяти, без запросов к БД"""
+        name = request.query_params.get('name', '').strip()
+        if name:
+            return Response(ingredient_index.search(name))
+        if fast_serializers_enabled(request):
+            rows = self.filter_queryset(self.get_queryset()).values(
+                *FastIngredientSerializer.fields
+            )
+            return Response(FastIngredientSerializer(rows, many=True).data)
+        return super().list(request, *args, **kwargs)
 
 
+@method_decorator(condition(etag_func=recipe_list_etag), name='list')
+@method_decorator(condition(
+    etag_func=recipe_detail_etag,
+    last_modified_func=recipe_detail_last_modified,
+), name='retrieve')
 class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     pagination_class = LimitPageNumberPaginator
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
     permission_classes = [IsOwnerOrReadOnly, ]
+    parser_classes = [JSONParser, RecipeMultiPartParser]
+    replica_actions = ('list', 'retrieve')
+
+    def initialize_request(self, request, *args, **kwargs):
+        # файл изображения сразу пишется на диск, с ограничением размера
+        request.upload_handlers = [RecipeImageUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
+    def get_queryset(self):
+        """один аннотированный запрос вместо запросов на каждый рецепт"""
+        return Recipe.objects.with_related().with_user_flags(
+            self.request.user
+        )
+
+    def list(self, request, *args, **kwargs):
+        """общая часть ответа кешируется, поля пользователя - накладываются"""
+        key = recipe_list_key(request)
+        data = cache.get(key)
+        if data is None:
+            response = super().list(request, *args, **kwargs)
+            cache.set(key, response.data, settings.RECIPE_CACHE_TIMEOUT)
+            return response
+        overlay_user_fields(request.user, data['results'])
+        return Response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        key = recipe_detail_key(request, kwargs['pk'])
+        data = cache.get(key)
+        if data is None:
+            response = super().retrieve(request, *args, **kwargs)
+            cache.set(key, response.data, settings.RECIPE_CACHE_TIMEOUT)
+            return response
+        overlay_user_fields(request.user, [data])
+        return Response(data)
 
     def get_serializer_class(self):
         """разделяет типы запросов на списковые и одиночные"""
         if self.action in ('list', 'retrieve'):
+            if fast_serializers_enabled(self.request):
+                return FastRecipeSerializer
             return RecipeSerializer
         return RecipeWriteSerializer
 
@@ -85,18 +181,9 @@ class RecipeViewSet(viewsets.ModelViewSet):
             permission_classes=[IsAuthenticated])
     def download_shopping_cart(self, request):
         """скачивает список ингридиентов из рецептов в корзине"""
-        shopping_dict = {}
-        ingredients = IngredientRecipe.objects.filter(
-            recipe__shopping_cart__user=request.user).values(
+        ingredients = ShoppingListItem.objects.filter(
+            user=request.user
+        ).values(
             'ingredient__name', 'ingredient__measurement_unit', 'amount'
-        )
-        for obj in ingredients:
-            ingredient = obj['ingredient__name']
-            if ingredient not in shopping_dict:
-                shopping_dict[ingredient] = {
-                    'measurement_unit': obj['ingredient__measurement_unit'],
-                    'amount': obj['amount']
-                }
-            else:
-                shopping_dict[ingredient]['amount'] += obj['amount']
-        return shopping_list_txt(shopping_dict, request.user)
+        ).order_by('ingredient__name')
+        return shopping_list_txt(ingredients, request.user)
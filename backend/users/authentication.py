@@ -0,0 +1,176 @@
+import copy
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+CachedToken = namedtuple('CachedToken', 'token version expires_at')
+PROCESS_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def token_digest(key):
+    # в ключах кеша - не сам токен, а его хеш
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def token_version(digest):
+    return f'foodgram:version:auth-token:{digest}'
+
+
+def get_token_version(digest):
+    """
+    Версия токена в общем кеше - случайная строка: ее смена делает
+    недоступными записи, сохраненные со старой.
+    """
+    key = token_version(digest)
+    version = cache.get(key)
+    if version is not None:
+        return version
+    version = uuid.uuid4().hex
+    if cache.add(key, version, None):
+        return version
+    # версию одновременно создал другой процесс
+    return cache.get(key, version)
+
+
+def bump_token_versions(digests):
+    cache.set_many(
+        {token_version(digest): uuid.uuid4().hex for digest in digests},
+        None,
+    )
+
+
+class TokenCache:
+    """
+    Токены с пользователями в памяти процесса: LRU на
+    AUTH_TOKEN_CACHE_SIZE записей, каждая живет AUTH_TOKEN_CACHE_TTL
+    секунд. У каждого токена есть версия в общем кеше, и запись
+    процесса действительна, только пока версия не сменилась: выход,
+    смена пароля и деактивация (users/signals.py) сразу видны всем
+    процессам ценой одного обращения к кешу вместо запроса к БД.
+    Промах в процессе сначала ищется в общем кеше.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        # растет при каждом сбросе: токен, прочитанный из БД до сброса,
+        # в кеш не попадет
+        self._generation = 0
+
+    def get(self, key, load):
+        """токен из кеша или из load(), для каждого вызова - своя копия"""
+        digest = token_digest(key)
+        generation = self._generation
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                self._entries.move_to_end(digest)
+        if entry is not None and time.monotonic() >= entry.expires_at:
+            entry = None
+        version = get_token_version(digest)
+        if entry is not None and entry.version != version:
+            entry = None
+        if entry is None:
+            token = cache.get(self.shared_key(digest, version))
+            if token is not None:
+                entry = self._store(digest, token, version, generation)
+        if entry is None:
+            token = load()
+            entry = self._store(digest, token, version, generation)
+            cache.set(
+                self.shared_key(digest, version), token,
+                settings.AUTH_TOKEN_CACHE_TTL,
+            )
+        return self._copy(entry.token)
+
+    def invalidate(self, keys=(), user_id=None):
+        """записи токенов keys и всех токенов пользователя user_id"""
+        digests = {token_digest(key) for key in keys}
+        with self._lock:
+            self._generation += 1
+            for digest, entry in list(self._entries.items()):
+                if digest in digests or entry.token.user_id == user_id:
+                    del self._entries[digest]
+        if digests:
+            bump_token_versions(digests)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def _store(self, digest, token, version, generation):
+        entry = CachedToken(
+            token, version, time.monotonic() + settings.AUTH_TOKEN_CACHE_TTL
+        )
+        with self._lock:
+            if generation != self._generation:
+                return entry
+            self._entries[digest] = entry
+            self._entries.move_to_end(digest)
+            while len(self._entries) > settings.AUTH_TOKEN_CACHE_SIZE:
+                self._entries.popitem(last=False)
+        return entry
+
+    @staticmethod
+    def shared_key(digest, version):
+        return f'foodgram:auth-token:{digest}:{version}'
+
+    @staticmethod
+    def _copy(token):
+        # представления могут менять request.user, а объект из кеша
+        # живет между запросами
+        user = copy.copy(token.user)
+        token = copy.copy(token)
+        token.user = user
+        return token
+
+
+token_cache = TokenCache()
+
+
+def token_cache_enabled():
+    """
+    Сброс записи виден другим процессам только через версию в общем
+    кеше. С кешем, своим у каждого процесса, отозванный токен
+    работал бы в остальных до истечения TTL, поэтому кеш токенов
+    включается только вместе с общим CACHE_BACKEND.
+    """
+    return (
+        settings.AUTH_TOKEN_CACHE_TTL > 0
+        and settings.CACHES['default']['BACKEND'] not in PROCESS_CACHES
+    )
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication без запроса к БД на каждый запрос: токен
+    с пользователем берется из token_cache.
+    """
+    model = Token
+
+    def authenticate_credentials(self, key):
+        if not token_cache_enabled():
+            return super().authenticate_credentials(key)
+        token = token_cache.get(key, lambda: self.load(key))
+        # неактивных в кеше нет, но запись могла устареть до сброса
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+        return token.user, token
+
+    def load(self, key):
+        return super().authenticate_credentials(key)[1]
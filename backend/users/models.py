@@ -1,11 +1,42 @@
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.tokens import default_token_generator
-from django.db import models
+from django.db import DatabaseError, models
 from django.db.models import F, Q
 from django.utils.translation import gettext_lazy as _
 
 
-class User(AbstractUser):
+class CounterFieldsMixin:
+    """
+    Счетчики меняются только выражениями F() в сигналах,
+    сохранение уже существующей записи их не перезаписывает.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (self._state.adding or kwargs.get('force_insert')
+                or kwargs.get('update_fields') is not None):
+            return super().save(*args, **kwargs)
+        deferred = self.get_deferred_fields()
+        if all(name in deferred for name in self.counter_fields):
+            # отложенные поля Django и так не сохраняет
+            return super().save(*args, **kwargs)
+        update_fields = [
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key
+            and field.name not in self.counter_fields
+            and field.attname not in deferred
+        ]
+        try:
+            return super().save(*args, update_fields=update_fields, **kwargs)
+        except DatabaseError:
+            # как обычный save: записи нет в БД - вставляем ее
+            if kwargs.get('force_update') or type(
+                    self)._base_manager.filter(pk=self.pk).exists():
+                raise
+        return super().save(*args, force_insert=True, **kwargs)
+
+
+class User(CounterFieldsMixin, AbstractUser):
     ADMIN = 'admin'
     MODERATOR = 'moderator'
     USER = 'user'
@@ -61,6 +92,18 @@ class User(AbstractUser):
         max_length=150,
         help_text=_('Введите пароль'),
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name=_('Количество рецептов'),
+        default=0,
+        editable=False,
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name=_('Количество подписчиков'),
+        default=0,
+        editable=False,
+    )
+
+    counter_fields = ('recipes_count', 'followers_count')
 
     class Meta:
         swappable = 'AUTH_USER_MODEL'
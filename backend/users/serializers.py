@@ -2,6 +2,9 @@ from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
+from recipes.fast_serializers import (FastSerializer, short_recipe_data,
+                                      user_data)
+from recipes.fields import ThumbnailsField
 from recipes.models import Recipe
 from .models import Follow, User
 
@@ -43,6 +46,8 @@ class CustomUserSerializer(UserSerializer):
         """
         Подписан ли пользователь на автора.
         """
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         if request.user.is_authenticated:  # type: ignore
             return Follow.objects.filter(user=request.user,  # type: ignore
@@ -54,9 +59,11 @@ class FollowRecipeSerializer(serializers.ModelSerializer):
     """
     Сериализатор для короткой модели рецепта в подписках.
     """
+    thumbnails = ThumbnailsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'thumbnails', 'cooking_time')
 
 
 class FollowSerializer(serializers.ModelSerializer):
@@ -65,7 +72,7 @@ class FollowSerializer(serializers.ModelSerializer):
     """
     is_subscribed = serializers.SerializerMethodField(read_only=True)
     recipes = serializers.SerializerMethodField(read_only=True)
-    recipes_count = serializers.SerializerMethodField(read_only=True)
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = User
@@ -81,6 +88,8 @@ class FollowSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         if request.user.is_authenticated:  # type: ignore
             return Follow.objects.filter(user=request.user,  # type: ignore
@@ -92,7 +101,10 @@ class FollowSerializer(serializers.ModelSerializer):
         if not request or request.user.is_anonymous:
             return False
         limit_recipes = request.query_params.get('recipes_limit')
-        if limit_recipes is not None:
+        if hasattr(obj, 'recipes_page'):
+            # FollowListAPIView.attach_recipes
+            recipes = obj.recipes_page
+        elif limit_recipes is not None:
             recipes = obj.recipes.all()[:(int(limit_recipes))]
         else:
             recipes = obj.recipes.all()
@@ -100,9 +112,25 @@ class FollowSerializer(serializers.ModelSerializer):
         return FollowRecipeSerializer(recipes, many=True,
                                       context=context).data
 
-    @staticmethod
-    def get_recipes_count(obj):
-        return obj.recipes.count()
+
+class FastFollowSerializer(FastSerializer):
+    """
+    То же, что FollowSerializer, для авторов из
+    FollowListAPIView с is_subscribed и recipes_page.
+    """
+
+    def to_representation(self, author):
+        request = self.context.get('request')
+        data = user_data(author, author.is_subscribed)
+        if not request or request.user.is_anonymous:
+            data['recipes'] = False
+        else:
+            data['recipes'] = [
+                short_recipe_data(recipe, request)
+                for recipe in author.recipes_page
+            ]
+        data['recipes_count'] = author.recipes_count
+        return data
 
 
 class UserFollowSerializer(serializers.ModelSerializer):
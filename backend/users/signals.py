@@ -0,0 +1,22 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import token_cache, token_cache_enabled
+from .models import User
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    # выход через djoser удаляет токен
+    if token_cache_enabled():
+        token_cache.invalidate(keys=[instance.key])
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, **kwargs):
+    # смена пароля, деактивация и любое другое изменение пользователя
+    if not token_cache_enabled():
+        return
+    keys = Token.objects.filter(user=instance).values_list('key', flat=True)
+    token_cache.invalidate(keys=keys, user_id=instance.id)
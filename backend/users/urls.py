@@ -9,7 +9,8 @@ follow_router_v1 = DefaultRouter()
 
 
 urlpatterns = [
-    path('users/subscriptions/', FollowListAPIView.as_view()),
+    path('users/subscriptions/', FollowListAPIView.as_view(),
+         name='subscriptions'),
     path('users/<int:id>/subscribe/', UserFollowApiView.as_view(),
          name='subscribe'),
     path('auth/', include('djoser.urls.authtoken')),
@@ -1,27 +1,59 @@
+from django.db.models import Value
 from django.shortcuts import get_object_or_404
 from rest_framework import generics, status, views
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
 from backend.pagination import LimitPageNumberPaginator
+from recipes.fast_serializers import fast_serializers_enabled
+from recipes.models import Recipe
 from .models import Follow, User
-from .serializers import FollowSerializer, UserFollowSerializer
+from .serializers import (FastFollowSerializer, FollowSerializer,
+                          UserFollowSerializer)
 
 
 class FollowListAPIView(generics.ListAPIView):
     pagination_class = LimitPageNumberPaginator
     permission_classes = [IsAuthenticated, ]
+    replica_actions = ('get',)
 
     def get(self, request):
         user = request.user
-        queryset = User.objects.filter(following__user=user)
+        queryset = User.objects.filter(following__user=user).annotate(
+            is_subscribed=Value(True)
+        ).order_by('-id')
         page = self.paginate_queryset(queryset)
-        serializer = FollowSerializer(
+        self.attach_recipes(page, request.query_params.get('recipes_limit'))
+        serializer_class = (
+            FastFollowSerializer if fast_serializers_enabled(request)
+            else FollowSerializer
+        )
+        serializer = serializer_class(
             page, many=True,
             context={'request': request}
         )
         return self.get_paginated_response(serializer.data)
 
+    @staticmethod
+    def attach_recipes(authors, recipes_limit):
+        """рецепты всех авторов страницы одним запросом"""
+        recipes = Recipe.objects.filter(
+            author_id__in=[author.id for author in authors]
+        )
+        fields = (
+            'id', 'name', 'image', 'processed_image', 'cooking_time',
+            'author_id',
+        )
+        if recipes_limit is not None:
+            recipes = recipes.limit_per_author(int(recipes_limit), fields)
+        else:
+            recipes = recipes.only(*fields).order_by('author_id', '-id')
+        by_author = {}
+        for recipe in recipes:
+            by_author.setdefault(recipe.author_id, []).append(recipe)
+        for author in authors:
+            author.recipes_page = by_author.get(author.id, [])
+
 
 class UserFollowApiView(views.APIView):
     permission_classes = [IsAuthenticated, ]